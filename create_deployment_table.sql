@@ -9,6 +9,64 @@ CREATE TABLE `deployment` (
   `url` varchar(255) DEFAULT NULL,
   `author` varchar(100) DEFAULT NULL,
   `fail_count` int(10) unsigned NOT NULL DEFAULT 0,
+  `failure_class` varchar(16) DEFAULT NULL,
+  `next_retry_at` timestamp NULL DEFAULT NULL,
+  `last_access_at` timestamp NULL DEFAULT NULL,
+  `suspended_at` timestamp NULL DEFAULT NULL,
+  `suspended_bytes` bigint(20) unsigned DEFAULT NULL,
+  `disk_bytes` bigint(20) unsigned DEFAULT NULL,
+  `database_bytes` bigint(20) unsigned DEFAULT NULL,
+  `disk_measured_at` timestamp NULL DEFAULT NULL,
+  `host` varchar(64) DEFAULT NULL,
+  `healthy` tinyint(1) DEFAULT NULL,
+  `cold_ttfb_ms` int(10) unsigned DEFAULT NULL,
+  `warm_ttfb_ms` int(10) unsigned DEFAULT NULL,
   PRIMARY KEY (`id`),
-  UNIQUE KEY `label_UK` (`label`)
-) DEFAULT CHARSET=utf8mb4;
\ No newline at end of file
+  UNIQUE KEY `label_UK` (`label`),
+  KEY `type_deployed_at_IDX` (`type`, `deployed_at`)
+) DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE `deployment_stage` (
+  `id` bigint(20) unsigned NOT NULL AUTO_INCREMENT,
+  `label` varchar(100) NOT NULL,
+  `source_sha` varchar(40) DEFAULT NULL,
+  `stage` varchar(100) NOT NULL,
+  `started_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `wall_seconds` double NOT NULL,
+  `cpu_seconds` double DEFAULT NULL,
+  `max_rss_kb` bigint(20) unsigned DEFAULT NULL,
+  `peak_memory_kb` bigint(20) unsigned DEFAULT NULL,
+  `success` tinyint(1) NOT NULL,
+  PRIMARY KEY (`id`),
+  KEY `label_source_sha_IDX` (`label`, `source_sha`),
+  KEY `started_at_IDX` (`started_at`)
+) DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE `deployment_job` (
+  `id` bigint(20) unsigned NOT NULL AUTO_INCREMENT,
+  `label` varchar(100) NOT NULL,
+  `priority` tinyint(3) unsigned NOT NULL,
+  `action` varchar(16) NOT NULL,
+  `payload` text NOT NULL,
+  `host` varchar(64) DEFAULT NULL,
+  `state` enum('queued','running','done','failed') NOT NULL DEFAULT 'queued',
+  `leased_by` varchar(64) DEFAULT NULL,
+  `lease_expires_at` timestamp NULL DEFAULT NULL,
+  `attempts` int(10) unsigned NOT NULL DEFAULT 0,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `finished_at` timestamp NULL DEFAULT NULL,
+  `error` text DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `state_priority_IDX` (`state`, `priority`, `id`),
+  KEY `label_state_IDX` (`label`, `state`)
+) DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE `deployment_host` (
+  `host` varchar(64) NOT NULL,
+  `address` varchar(255) NOT NULL,
+  `free_bytes` bigint(20) unsigned NOT NULL,
+  `load_average` double NOT NULL,
+  `cpu_count` int(10) unsigned NOT NULL,
+  `heartbeat_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`host`)
+) DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,86 @@
+import os
+import time
+from typing import List, Optional
+
+from config import Config
+from logger import get_logger
+
+logger = get_logger()
+
+
+class AdmissionController:
+    """
+    Delays the next build command while the host is saturated, so that the builds do not slow down the
+    live deployments served from the same host.
+
+    A build stage (``Config.ADMISSION_STAGES``) only starts while the load average per CPU is below
+    ``Config.ADMISSION_MAX_LOAD``, at least ``Config.ADMISSION_MIN_AVAILABLE_BYTES`` are available (``MemAvailable``)
+    and the pressure stall information of memory and CPU (``some avg10``, Linux 4.20+) is below
+    ``Config.ADMISSION_MAX_MEMORY_PRESSURE`` respectively ``Config.ADMISSION_MAX_CPU_PRESSURE``. It waits at most
+    ``Config.ADMISSION_MAX_WAIT`` seconds, then the command starts anyway, so that a host busy with other work
+    does not stop the deployments.
+    """
+
+    def wait(self, label: str, stage: Optional[str], deadline_seconds: Optional[float] = None) -> float:
+        """Wait until the host can take the stage, returns the seconds waited."""
+        if stage not in Config.ADMISSION_STAGES:
+            return 0.0
+        started = time.monotonic()
+        max_wait = Config.ADMISSION_MAX_WAIT
+        if deadline_seconds is not None:
+            max_wait = min(max_wait, deadline_seconds)
+        reported = None
+        while True:
+            reasons = self.saturation()
+            waited = time.monotonic() - started
+            if not reasons:
+                if reported is not None:
+                    logger.info(f"Start {stage} of {label} after waiting {waited:.0f}s for resources")
+                return waited
+            if waited >= max_wait:
+                logger.warning(f"Start {stage} of {label} although the host is saturated ({', '.join(reasons)})")
+                return waited
+            if reasons != reported:
+                logger.info(f"Delay {stage} of {label}, the host is saturated: {', '.join(reasons)}")
+                reported = reasons
+            time.sleep(Config.ADMISSION_POLL_INTERVAL)
+
+    def saturation(self) -> List[str]:
+        """Reasons why no build should start now, empty if the host has capacity."""
+        reasons = []
+        load = os.getloadavg()[0] / (os.cpu_count() or 1)
+        if load >= Config.ADMISSION_MAX_LOAD:
+            reasons.append(f"load {load:.2f} per CPU")
+        available = self.memory_available()
+        if available is not None and available < Config.ADMISSION_MIN_AVAILABLE_BYTES:
+            reasons.append(f"{available // 1024 ** 2} MiB memory available")
+        for resource, limit in (('memory', Config.ADMISSION_MAX_MEMORY_PRESSURE),
+                                ('cpu', Config.ADMISSION_MAX_CPU_PRESSURE)):
+            pressure = self.pressure(resource)
+            if pressure is not None and pressure >= limit:
+                reasons.append(f"{resource} pressure {pressure:.1f}%")
+        return reasons
+
+    @staticmethod
+    def memory_available() -> Optional[int]:
+        try:
+            with open('/proc/meminfo', 'r') as f:
+                for line in f:
+                    if line.startswith('MemAvailable:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return None
+
+    @staticmethod
+    def pressure(resource: str) -> Optional[float]:
+        """Share of the last 10 seconds in which some task stalled on the resource, in percent."""
+        try:
+            with open(f'/proc/pressure/{resource}', 'r') as f:
+                for line in f:
+                    fields = line.split()
+                    if fields and fields[0] == 'some':
+                        return float(dict(field.split('=') for field in fields[1:])['avg10'])
+        except (OSError, KeyError, ValueError):
+            pass
+        return None
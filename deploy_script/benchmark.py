@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of full ``Deployer.run()`` calls, to compare the deployer before and after a change.
+
+GitHub is replaced by fake_github.py, serving synthetic pull requests whose branches are generated in a
+local bare repository (git rewrites the upstream URL to it). Build commands (composer, npm, encore,
+catro:reset, ...) are replaced by sleeps of configurable duration; git, the caches, the nginx site files
+and the database run for real. All files are written below ``WORK_FOLDER``.
+
+It needs a throwaway MariaDB server with root access, e.g.
+``docker run -d -p 3307:3306 -e MARIADB_ROOT_PASSWORD=benchmark mariadb``.
+ALL its databases and users (except root) are dropped before every scenario.
+
+Usage: python3 benchmark.py --mysql-port 3307 --mysql-password benchmark --prs 10,50,200
+
+For each number of pull requests, the first run deploys all of them. Before every further run,
+``--push-fraction`` of them get a new commit (what it touches is chosen by the ``--churn`` weights)
+and ``--close-fraction`` are closed and replaced by new ones. Every run reports its wall time, GitHub API
+requests, database queries, nginx reloads and the stages with the most time; ``--results`` appends them
+as JSON lines, so the scaling of the deployer can be tracked over time.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from config import Config
+
+# the deployer modules read some settings on import (log file, default folders), so they are set first
+WORK_FOLDER = os.path.join(tempfile.gettempdir(), 'prdeployer-benchmark')
+os.makedirs(WORK_FOLDER, exist_ok=True)
+Config.LOG_FILE = os.path.join(WORK_FOLDER, 'deployer.log')
+Config.WEB_FOLDER = os.path.join(WORK_FOLDER, 'www', '')
+Config.RELEASES_FOLDER = os.path.join(WORK_FOLDER, 'releases', '')
+Config.GIT_MIRROR_FOLDER = os.path.join(WORK_FOLDER, 'mirror.git')
+Config.DEPENDENCY_CACHE_FOLDER = os.path.join(WORK_FOLDER, 'cache', 'dependencies', '')
+Config.ASSET_CACHE_FOLDER = os.path.join(WORK_FOLDER, 'cache', 'assets', '')
+Config.DB_SNAPSHOT_FOLDER = os.path.join(WORK_FOLDER, 'cache', 'db-snapshots', '')
+Config.BUILD_MANIFEST_FOLDER = os.path.join(WORK_FOLDER, 'cache', 'manifests', '')
+Config.GITHUB_CACHE_FOLDER = os.path.join(WORK_FOLDER, 'cache', 'github', '')
+Config.SUSPEND_FOLDER = os.path.join(WORK_FOLDER, 'cache', 'suspended', '')
+Config.SCHEDULER_DEFERRED_FILE = os.path.join(WORK_FOLDER, 'cache', 'deferred.json')
+Config.NGINX_SITES_AVAILABLE = os.path.join(WORK_FOLDER, 'nginx', 'sites-available', '')
+Config.NGINX_SITES_ENABLED = os.path.join(WORK_FOLDER, 'nginx', 'sites-enabled', '')
+Config.NGINX_VALIDATE_SITES = False
+Config.STAGE_CGROUP_ROOT = None
+Config.ADMISSION_STAGES = []  # the sleeps do not load the host, waiting would only measure other processes
+Config.WARMUP_URLS = []  # no nginx serves the synthetic deployments, only cache:warmup runs
+Config.ACCESS_LOG_FOLDER = os.path.join(WORK_FOLDER, 'log', 'access', '')
+Config.LABEL_LOG_FILE_DIRECTORY = os.path.join(WORK_FOLDER, 'log', 'labels', '')
+Config.STATUS_PAGE_FOLDER = os.path.join(WORK_FOLDER, 'index', '')
+Config.WAKE_REQUEST_FOLDER = os.path.join(WORK_FOLDER, 'wake', '')
+Config.PROMETHEUS_TEXTFILE = None
+Config.RUN_TIME_BUDGET = None
+Config.GC_MIN_FREE_BYTES = None
+
+import pymysql  # noqa: E402
+from db_snapshot import DatabaseSnapshots  # noqa: E402
+from fake_github import FakeGitHubServer  # noqa: E402
+from git_mirror import GitMirror  # noqa: E402
+from logger import get_logger, set_console_level  # noqa: E402
+from nginx_sites import NginxSites  # noqa: E402
+from prdeployer import Deployer, DeploymentData, DeploymentType  # noqa: E402
+from subprocess_runner import SubprocessResult, SubprocessRunner  # noqa: E402
+
+logger = get_logger()
+
+BRANCHES = ['develop', 'master']
+DEFAULT_DURATIONS = {  # seconds on the production server, multiplied with --time-scale
+    'composer': 90,
+    'composer-scripts': 10,
+    'npm': 60,
+    'encore': 45,
+    'reset': 120,
+    'cache': 8,
+    'jwt': 2,
+    'database': 5,
+}
+DEFAULT_CHURN = {'src': 0.6, 'assets': 0.2, 'composer': 0.05, 'npm': 0.05, 'migrations': 0.1}
+
+
+class SyntheticRepository:
+    """
+    Bare repository with the branches of ``BRANCHES`` and one branch per pull request.
+
+    Commits are written with ``git fast-import``, which is fast enough for hundreds of branches.
+    The files mimic the paths of ``Config.BUILD_STAGE_INPUTS``, so that the build manifest of a
+    push only selects the stages whose inputs were touched (see ``CHURN_PATHS``).
+    """
+    CHURN_PATHS = {
+        'src': 'src/Feature/Pr{number}.php',
+        'assets': 'assets/pr{number}.js',
+        'composer': 'composer.lock',
+        'npm': 'package-lock.json',
+        'migrations': 'migrations/VersionPr{number}.php',
+    }
+
+    path: str
+    files: int
+    pulls: Dict[int, str]  # number -> branch of the open pull requests
+    _next_number: int
+    _pushes: int
+    _random: random.Random
+
+    def __init__(self, path: str, files: int, seed: int):
+        self.path = path
+        self.files = files
+        self.pulls = {}
+        self._next_number = 1
+        self._pushes = 0
+        self._random = random.Random(seed)
+
+    def create(self, count: int):
+        shutil.rmtree(self.path, ignore_errors=True)
+        subprocess.run(['git', 'init', '--quiet', '--bare', self.path], check=True)
+        files = {
+            'composer.json': json.dumps({'require': {'php': '>=8.1'}}),
+            'composer.lock': 'lock 0\n',
+            'package.json': json.dumps({'scripts': {'encore': 'encore'}}),
+            'package-lock.json': 'lock 0\n',
+            'webpack.config.js': '// webpack\n',
+            'assets/app.js': '// app\n',
+            'migrations/Version1.php': '<?php\n',
+            'fixtures/projects.json': '[]\n',
+            'docker/app/init-jwt-config.sh': '#!/bin/sh\n',
+            'config/packages/lexik_jwt_authentication.yaml': 'lexik_jwt_authentication: ~\n',
+            'public/index.php': '<?php\n',
+        }
+        for i in range(self.files):
+            files[f'src/Generated/File{i}.php'] = f'<?php\n// generated file {i}\n'
+        commits = [('refs/heads/' + BRANCHES[0], None, files)]
+        commits += [('refs/heads/' + branch, ':1', {}) for branch in BRANCHES[1:]]
+        numbers = list(range(self._next_number, self._next_number + count))
+        self._next_number += count
+        for number in numbers:
+            self.pulls[number] = f'pr-{number}'
+            commits.append(('refs/heads/' + self.pulls[number], ':1', self._change(number, 'src')))
+        self._fast_import(commits)
+
+    def push(self, fraction: float, churn: Dict[str, float]):
+        """New commits on a random fraction of the open pull requests."""
+        tips = self._tips()
+        commits = []
+        for number in self._sample(fraction):
+            kind = self._random.choices(list(churn), weights=list(churn.values()))[0]
+            ref = 'refs/heads/' + self.pulls[number]
+            commits.append((ref, tips[ref], self._change(number, kind)))
+        self._fast_import(commits)
+
+    def replace(self, fraction: float):
+        """Close a random fraction of the pull requests and open as many new ones."""
+        closed = self._sample(fraction)
+        for number in closed:
+            del self.pulls[number]
+        tips = self._tips()
+        commits = []
+        for _ in closed:
+            number = self._next_number
+            self._next_number += 1
+            self.pulls[number] = f'pr-{number}'
+            commits.append(('refs/heads/' + self.pulls[number], tips['refs/heads/' + BRANCHES[0]],
+                            self._change(number, 'src')))
+        self._fast_import(commits)
+
+    def fixture(self) -> Dict[str, Any]:
+        """The GitHub API responses of fake_github.py for the current state."""
+        tips = self._tips()
+        pulls = []
+        for number, branch in sorted(self.pulls.items(), reverse=True):
+            pulls.append({
+                'number': number,
+                'state': 'open',
+                'title': f'Synthetic pull request {number}',
+                'html_url': f'https://github.com/{Config.GITHUB_REPO_OWNER}/{Config.GITHUB_REPO_NAME}/pull/{number}',
+                'user': {'login': 'benchmark'},
+                'labels': [],
+                'head': {'ref': branch, 'sha': tips['refs/heads/' + branch],
+                         'repo': {'clone_url': GitMirror.upstream_url()}},
+                'base': {'ref': BRANCHES[0]},
+            })
+        branches = {}
+        for branch in BRANCHES:
+            branches[branch] = {'name': branch, 'commit': {'sha': tips['refs/heads/' + branch], 'commit': {
+                'author': {'name': 'benchmark'}, 'message': f'Synthetic {branch}'}}}
+        return {'pulls': pulls, 'branches': branches}
+
+    def _change(self, number: int, kind: str) -> Dict[str, str]:
+        self._pushes += 1
+        return {self.CHURN_PATHS[kind].format(number=number): f'// pr {number}, push {self._pushes}\n'}
+
+    def _sample(self, fraction: float) -> List[int]:
+        numbers = sorted(self.pulls)
+        return self._random.sample(numbers, min(len(numbers), round(len(numbers) * fraction)))
+
+    def _tips(self) -> Dict[str, str]:
+        p = subprocess.run(['git', 'for-each-ref', '--format=%(refname) %(objectname)'], cwd=self.path,
+                           stdout=subprocess.PIPE, check=True)
+        return dict(line.split(' ', 1) for line in p.stdout.decode('utf-8').splitlines())
+
+    def _fast_import(self, commits: List[tuple]):
+        stream = []
+        timestamp = int(time.time())
+        for i, (ref, parent, files) in enumerate(commits):
+            stream.append(f'commit {ref}\n')
+            if i == 0 and parent is None:
+                stream.append('mark :1\n')
+            stream.append(f'committer Benchmark <benchmark@example.com> {timestamp} +0000\n')
+            stream.append(self._data(f'Synthetic commit on {ref}'))
+            if parent is not None:
+                stream.append(f'from {parent}\n')
+            for path, content in files.items():
+                stream.append(f'M 100644 inline {path}\n' + self._data(content))
+            stream.append('\n')
+        subprocess.run(['git', 'fast-import', '--quiet', '--force'], input=''.join(stream).encode('utf-8'),
+                       cwd=self.path, check=True)
+
+    @staticmethod
+    def _data(content: str) -> str:
+        return f'data {len(content.encode("utf-8"))}\n{content}\n'
+
+
+class SyntheticRunner(SubprocessRunner):
+    """Replaces the build commands by sleeps which create their main output, runs everything else."""
+    COMMANDS = [  # stage of DEFAULT_DURATIONS, pattern of the command line, created file (relative to cwd)
+        ('composer', re.compile(r'composer install'), 'vendor/autoload.php'),
+        ('composer-scripts', re.compile(r'composer run-script'), None),
+        ('npm', re.compile(r'npm ci'), 'node_modules/.package-lock.json'),
+        ('encore', re.compile(r'npm run encore'), 'public/build/manifest.json'),
+        ('reset', re.compile(r'catro:reset'), 'public/resources/.reset'),
+        ('cache', re.compile(r'cache:clear|cache:warmup'), None),
+        ('jwt', re.compile(r'init-jwt-config'), None),
+        ('database', re.compile(r'mysqldump|mysql '), None),
+        (None, re.compile(r'^chown '), None),  # the benchmark does not need to run as root
+    ]
+
+    durations: Dict[str, float]
+    time_scale: float
+
+    def __init__(self, durations: Dict[str, float], time_scale: float):
+        super().__init__(Config.SUBPROCESS_OUTPUT_TAIL_BYTES)
+        self.durations = durations
+        self.time_scale = time_scale
+
+    def run(self, command: List[str], cwd: str = None, env: Dict[str, str] = None, timeout: float = None,
+            on_line=None) -> SubprocessResult:
+        if command[:2] == ['sudo', '-u']:
+            command = command[3:]
+        command_line = ' '.join(command)
+        for stage, pattern, output in self.COMMANDS:
+            if not pattern.search(command_line):
+                continue
+            time.sleep(self.durations.get(stage, 0) * self.time_scale)
+            if output is not None and cwd is not None:
+                os.makedirs(os.path.dirname(os.path.join(cwd, output)), exist_ok=True)
+                open(os.path.join(cwd, output), 'w').close()
+            if 'mysqldump' in command_line:
+                # the dump file, see db_snapshot.dump_database()
+                dump_files = [arg for arg in command if arg.endswith(DatabaseSnapshots.DUMP_FILE)]
+                if not dump_files:
+                    raise Exception(f"No {DatabaseSnapshots.DUMP_FILE} argument in the dump command {command_line}")
+                open(dump_files[0], 'w').close()
+            return SubprocessResult(0, False, SimpleNamespace(ru_utime=0.0, ru_stime=0.0, ru_maxrss=0), '')
+        return super().run(command, cwd, env, timeout, on_line)
+
+
+class CountingConnection(pymysql.connections.Connection):
+    queries = 0
+    _lock = threading.Lock()
+
+    def query(self, sql, unbuffered=False):
+        with CountingConnection._lock:
+            CountingConnection.queries += 1
+        return super().query(sql, unbuffered)
+
+
+class SimulatedNginxSites(NginxSites):
+    reloads: int
+
+    def __init__(self):
+        super().__init__()
+        self.reloads = 0
+
+    def reload_if_changed(self):
+        with self._lock:
+            if not self._changed:
+                return
+            self._changed = False
+            self.reloads += 1
+
+
+class SimulatedDeployer(Deployer):
+    _mysql: Dict[str, Any]
+
+    def __init__(self, runner: SubprocessRunner, mysql: Dict[str, Any]):
+        super().__init__()
+        self._subprocess_runner = runner
+        self.nginx = SimulatedNginxSites()
+        self._garbage_collector.nginx = self.nginx
+        self._mysql = mysql
+
+    def _connect(self, host: str) -> pymysql.Connection:
+        return CountingConnection(charset='utf8mb4', autocommit=False, cursorclass=pymysql.cursors.DictCursor,
+                                  **self._mysql)
+
+    @staticmethod
+    def _detect_available_php_versions() -> List[str]:
+        return ['8.1']
+
+    @staticmethod
+    def _detect_node_version() -> str:
+        return 'v18.0.0'
+
+    @staticmethod
+    def _set_worktree_owner(paths: List[str], label: str):
+        pass
+
+
+def reset_state(mysql: Dict[str, Any]):
+    """Remove all files of the previous scenario, drop all databases and users and create the deployment table."""
+    for name in os.listdir(WORK_FOLDER):
+        if name != os.path.basename(Config.LOG_FILE):
+            path = os.path.join(WORK_FOLDER, name)
+            shutil.rmtree(path) if os.path.isdir(path) else os.unlink(path)
+    for folder in (Config.WEB_FOLDER, Config.RELEASES_FOLDER, Config.NGINX_SITES_AVAILABLE, Config.NGINX_SITES_ENABLED,
+                   Config.LABEL_LOG_FILE_DIRECTORY, Config.ACCESS_LOG_FOLDER, Config.STATUS_PAGE_FOLDER):
+        os.makedirs(folder, exist_ok=True)
+
+    connection = pymysql.connect(charset='utf8mb4', cursorclass=pymysql.cursors.DictCursor, **mysql)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT `schema_name` AS name FROM information_schema.schemata")
+            for row in cursor.fetchall():
+                if row['name'] not in ('information_schema', 'mysql', 'performance_schema', 'sys'):
+                    cursor.execute(f"DROP DATABASE `{row['name']}`")
+            cursor.execute("SELECT `User` AS user, `Host` AS host FROM mysql.user")
+            for row in cursor.fetchall():
+                if row['user'] not in ('root', 'mysql', 'mariadb.sys', mysql['user'], ''):
+                    cursor.execute("DROP USER %s@%s", (row['user'], row['host']))
+            cursor.execute("CREATE DATABASE `deployment`")
+            cursor.execute("USE `deployment`")
+            with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..',
+                                   'create_deployment_table.sql'), 'r') as f:
+                for statement in f.read().split(';'):
+                    if statement.strip():
+                        cursor.execute(statement)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def stage_totals(mysql: Dict[str, Any], after_id: int) -> Dict[str, Dict[str, float]]:
+    """Count and summed wall time of the stages recorded after the id, commit hashes removed from their names."""
+    connection = pymysql.connect(charset='utf8mb4', cursorclass=pymysql.cursors.DictCursor, **mysql)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT `stage`, COUNT(*) AS count, SUM(`wall_seconds`) AS wall_seconds "
+                           "FROM deployment.deployment_stage WHERE `id` > %s GROUP BY `stage`", (after_id,))
+            rows = cursor.fetchall()
+    finally:
+        connection.close()
+    totals = {}
+    for row in rows:
+        stage = re.sub(r'\b[0-9a-f]{40}\b', '<sha>', row['stage'])
+        total = totals.setdefault(stage, {'count': 0, 'wall_seconds': 0.0})
+        total['count'] += int(row['count'])
+        total['wall_seconds'] += float(row['wall_seconds'])
+    return totals
+
+
+def last_stage_id(mysql: Dict[str, Any]) -> int:
+    connection = pymysql.connect(charset='utf8mb4', cursorclass=pymysql.cursors.DictCursor, **mysql)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COALESCE(MAX(`id`), 0) AS id FROM deployment.deployment_stage")
+            return int(cursor.fetchone()['id'])
+    finally:
+        connection.close()
+
+
+def run_scenario(count: int, args, server: FakeGitHubServer, mysql: Dict[str, Any]) -> List[Dict[str, Any]]:
+    logger.warning(f"Benchmark with {count} pull requests")
+    reset_state(mysql)
+    repository = SyntheticRepository(os.path.join(WORK_FOLDER, 'upstream.git'), args.repository_files, args.seed)
+    repository.create(count)
+    server.fixture = repository.fixture()
+    deployer = SimulatedDeployer(SyntheticRunner(args.durations, args.time_scale), mysql)
+
+    # the tracked branches are deployed before the measured runs
+    deployer._git_mirror.start_run()
+    deployer.connect_db()
+    try:
+        deployer.store.load(deployer.db_connection)
+        for branch in BRANCHES:
+            result = server.fixture['branches'][branch]
+            deployer.create_deployment(DeploymentData(branch, result['commit']['sha'], branch,
+                                                      GitMirror.upstream_url(), f'Synthetic {branch}',
+                                                      type=DeploymentType.BRANCH))
+        deployer.flush_state()
+    finally:
+        deployer.close_db()
+
+    results = []
+    for run in range(1, args.runs + 1):
+        if run > 1:
+            repository.push(args.push_fraction, args.churn)
+            repository.replace(args.close_fraction)
+            server.fixture = repository.fixture()
+        requests_before = dict(server.stats)
+        queries_before = CountingConnection.queries
+        reloads_before = deployer.nginx.reloads
+        stage_id = last_stage_id(mysql)
+
+        started_at = time.monotonic()
+        deployer.run()
+        wall_seconds = time.monotonic() - started_at
+
+        result = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'commit': _deployer_commit(),
+            'pull_requests': count,
+            'run': run,
+            'wall_seconds': round(wall_seconds, 3),
+            'api_requests': server.stats['requests'] - requests_before['requests'],
+            'api_not_modified': server.stats['not_modified'] - requests_before['not_modified'],
+            'db_queries': CountingConnection.queries - queries_before,
+            'nginx_reloads': deployer.nginx.reloads - reloads_before,
+            'stages': stage_totals(mysql, stage_id),
+            'settings': {'backend': Config.GITHUB_BACKEND, 'workers': Config.MAX_PARALLEL_DEPLOYMENTS,
+                         'time_scale': args.time_scale, 'push_fraction': args.push_fraction,
+                         'close_fraction': args.close_fraction, 'churn': args.churn,
+                         'repository_files': args.repository_files},
+        }
+        results.append(result)
+        _print_result(result, args.top_stages)
+    return results
+
+
+def _print_result(result: Dict[str, Any], top_stages: int):
+    print(f"{result['pull_requests']:>5} PRs  run {result['run']}: {result['wall_seconds']:8.2f}s  "
+          f"{result['api_requests']:4d} API requests ({result['api_not_modified']} not modified)  "
+          f"{result['db_queries']:6d} DB queries  {result['nginx_reloads']} nginx reload(s)")
+    stages = sorted(result['stages'].items(), key=lambda x: x[1]['wall_seconds'], reverse=True)
+    for stage, total in stages[:top_stages]:
+        print(f"        {total['wall_seconds']:8.2f}s {total['count']:5d}x  {stage}")
+    sys.stdout.flush()
+
+
+def _deployer_commit() -> Optional[str]:
+    p = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.realpath(__file__)),
+                       stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    return p.stdout.decode('utf-8').strip() if p.returncode == 0 else None
+
+
+def _weights(value: str) -> Dict[str, float]:
+    weights = {}
+    for item in value.split(','):
+        key, _, number = item.partition('=')
+        weights[key.strip()] = float(number)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--prs', default='10,50,200', help="comma separated numbers of open pull requests")
+    parser.add_argument('--runs', type=int, default=3, help="runs per number of pull requests")
+    parser.add_argument('--push-fraction', type=float, default=0.2)
+    parser.add_argument('--close-fraction', type=float, default=0.05)
+    parser.add_argument('--churn', type=_weights, default=DEFAULT_CHURN,
+                        help="weights of what a push touches, e.g. src=0.6,assets=0.2,composer=0.05,npm=0.05,"
+                             "migrations=0.1")
+    parser.add_argument('--durations', type=_weights, default={},
+                        help="seconds of the build commands, e.g. composer=90,npm=60,encore=45,reset=120")
+    parser.add_argument('--time-scale', type=float, default=0.01, help="factor for all durations")
+    parser.add_argument('--repository-files', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=Config.MAX_PARALLEL_DEPLOYMENTS)
+    parser.add_argument('--backend', choices=['rest', 'graphql'], default='rest')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--top-stages', type=int, default=8)
+    parser.add_argument('--results', help="append the results as JSON lines to this file")
+    parser.add_argument('--mysql-host', default='127.0.0.1')
+    parser.add_argument('--mysql-port', type=int, required=True)
+    parser.add_argument('--mysql-user', default='root')
+    parser.add_argument('--mysql-password', default='')
+    parser.add_argument('--verbose', action='store_true', help="show the log of the deployer")
+    args = parser.parse_args()
+    args.durations = dict(DEFAULT_DURATIONS, **args.durations)
+
+    if not args.verbose:
+        set_console_level(logging.WARNING)
+
+    mysql = {'host': args.mysql_host, 'port': args.mysql_port, 'user': args.mysql_user,
+             'password': args.mysql_password}
+    Config.MYSQL_USER = args.mysql_user
+    Config.MYSQL_PASSWORD = args.mysql_password
+    Config.MAX_PARALLEL_DEPLOYMENTS = args.workers
+    Config.GITHUB_BACKEND = args.backend
+    Config.GITHUB_TOKEN = 'benchmark' if args.backend == 'graphql' else None
+
+    # git clones the upstream URL of the pull requests from the synthetic repository
+    git_config = os.path.join(tempfile.gettempdir(), 'prdeployer-benchmark.gitconfig')
+    with open(git_config, 'w') as f:
+        print(f'[url "{os.path.join(WORK_FOLDER, "upstream.git")}"]', file=f)
+        print(f'\tinsteadOf = {GitMirror.upstream_url()}', file=f)
+        print('[safe]\n\tdirectory = *', file=f)
+    os.environ['GIT_CONFIG_GLOBAL'] = git_config
+    os.environ['GIT_CONFIG_NOSYSTEM'] = '1'
+    # all git commands run as the current user
+    GitMirror.worktree_git = classmethod(lambda cls, git_args: ['git'] + git_args)
+
+    server = FakeGitHubServer({}).start()
+    Config.GITHUB_API_URL = server.url
+    Config.GITHUB_GRAPHQL_URL = server.url + '/graphql'
+    try:
+        for count in [int(value) for value in args.prs.split(',')]:
+            results = run_scenario(count, args, server, mysql)
+            if args.results:
+                with open(args.results, 'a') as f:
+                    for result in results:
+                        print(json.dumps(result), file=f)
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
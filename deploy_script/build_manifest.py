@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import subprocess
+from typing import Dict, List, Optional
+
+from config import Config
+from git_mirror import GitMirror
+from logger import get_logger
+
+logger = get_logger()
+
+
+class BuildManifest:
+    """
+    Hashes of the inputs of every build stage of a deployment.
+
+    The hash of a stage is computed from the git object ids of its input paths
+    (see ``Config.BUILD_STAGE_INPUTS``) at the deployed commit, so it only changes
+    if the diff between two commits touches one of these paths.
+    """
+    STAGES = ['composer', 'npm', 'reset', 'encore', 'jwt']
+
+    label: str
+    source_sha: str
+    stages: Dict[str, str]
+
+    def __init__(self, label: str, source_sha: str, stages: Dict[str, str]):
+        self.label = label
+        self.source_sha = source_sha
+        self.stages = stages
+
+    def __repr__(self):
+        return 'BuildManifest(' + repr(self.label) + ', ' + repr(self.source_sha) + ', ' + repr(self.stages) + ')'
+
+    @classmethod
+    def compute(cls, label: str, git_folder: str, source_sha: str, extra: Dict[str, str] = None) -> 'BuildManifest':
+        """Compute the manifest of the commit, extra values (e.g. the PHP version) are hashed into their stage."""
+        extra = extra or {}
+        stages = {}
+        for stage in cls.STAGES:
+            sha = hashlib.sha256()
+            sha.update(cls._ls_tree(git_folder, source_sha, Config.BUILD_STAGE_INPUTS[stage]))
+            sha.update(extra.get(stage, '').encode('utf-8'))
+            stages[stage] = sha.hexdigest()
+        return cls(label, source_sha, stages)
+
+    @classmethod
+    def load(cls, label: str, path: str = None) -> Optional['BuildManifest']:
+        """The manifest of the deployed commit, or the copy at path (see ``Releases.manifest_path()``)."""
+        try:
+            with open(path or cls._path(label), 'r') as f:
+                data = json.load(f)
+            return cls(label, data['source_sha'], data['stages'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, path: str = None):
+        path = path or self._path(self.label)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'source_sha': self.source_sha, 'stages': self.stages}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def delete(cls, label: str):
+        try:
+            os.unlink(cls._path(label))
+        except FileNotFoundError:
+            pass
+
+    def changed_stages(self, previous: Optional['BuildManifest']) -> List[str]:
+        """Stages whose inputs differ from the previous manifest, all stages if there is none."""
+        if previous is None:
+            return list(self.STAGES)
+        return [stage for stage in self.STAGES if previous.stages.get(stage) != self.stages[stage]]
+
+    @staticmethod
+    def _path(label: str) -> str:
+        return os.path.join(Config.BUILD_MANIFEST_FOLDER, label + '.json')
+
+    @staticmethod
+    def _ls_tree(git_folder: str, source_sha: str, paths: List[str]) -> bytes:
+        p = subprocess.run(GitMirror.worktree_git(["ls-tree", "--full-tree", source_sha, "--"] + paths),
+                           cwd=git_folder, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if p.returncode != 0:
+            raise Exception(f"Failed to list build inputs of {source_sha}: {p.stderr.decode('utf-8').strip()}")
+        return p.stdout
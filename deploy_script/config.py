@@ -1,13 +1,127 @@
+import socket
+
+
 class Config:
+    MYSQL_HOST = 'localhost'  # server of the deployment databases, their users are created for localhost
     MYSQL_USER = 'root'
     MYSQL_PASSWORD = 'MYSQL_ROOT_PASSWORD'
+    STATE_MYSQL_HOST = None  # server of the deployment tables if it is not MYSQL_HOST (shared by all hosts)
     WEB_FOLDER = '/var/www/catroweb/'
+    RELEASES_FOLDER = '/var/www/catroweb-releases/'  # <label>/<release>, WEB_FOLDER/<label> links the active one
+    RELEASE_RETENTION = 2  # releases kept per deployment (the active one and the previous ones for rollback)
+    RELEASE_STAGE_OUTPUTS = {  # untracked paths of a stage, linked from the active release if the stage is unchanged
+        'composer': ['vendor', 'public/bundles'],
+        'npm': ['node_modules'],
+        'reset': ['public/resources'],
+        'encore': ['public/build'],
+        'jwt': ['config/jwt', '.jwt'],
+    }
+    RELEASE_COPY_FILES = ['.env.local']  # untracked files every release copies from the active one
+    RELEASE_RESYNC_PATHS = ['public/resources']  # outputs written by the live application, linked again before a switch
+    GIT_MIRROR_FOLDER = '/var/cache/prdeployer/mirror.git'  # bare repository shared by all deployments
+    DEPENDENCY_CACHE_FOLDER = '/var/cache/prdeployer/dependencies/'  # vendor/ and node_modules/ by lockfile hash
+    DEPENDENCY_CACHE_MAX_BYTES = 20 * 1024 ** 3
+    DEPENDENCY_CACHE_LINK_MODE = 'hardlink'  # 'hardlink' or 'copy' (copy-on-write if supported)
+    ASSET_CACHE_FOLDER = '/var/cache/prdeployer/assets/'  # public/build by hash of the encore inputs, None: disabled
+    ASSET_CACHE_MAX_BYTES = 5 * 1024 ** 3  # uses DEPENDENCY_CACHE_LINK_MODE as well
+    ENCORE_PRODUCTION_TYPES = []  # deployment types built with 'encore production' (minified), e.g. ['branch']
     NGINX_SITES_AVAILABLE = '/etc/nginx/sites-available/'
     NGINX_SITES_ENABLED = '/etc/nginx/sites-enabled/'
+    NGINX_CONFIG_FOLDER = '/etc/nginx/'
+    NGINX_VALIDATE_SITES = True  # check new site files with nginx -t before they are enabled
+    NGINX_RELOAD_DEBOUNCE = 10  # seconds, reloads requested by the daemon within this time are coalesced
     GITHUB_REPO_OWNER = 'Catrobat'
     GITHUB_REPO_NAME = 'Catroweb'
+    GITHUB_API_URL = 'https://api.github.com'
+    GITHUB_GRAPHQL_URL = 'https://api.github.com/graphql'
+    GITHUB_BACKEND = 'rest'  # 'rest' or 'graphql' (one query for all pull requests and branches, needs GITHUB_TOKEN)
+    GITHUB_TOKEN = None  # optional personal access token, raises the rate limit from 60 to 5000 requests per hour
+    GITHUB_CACHE_FOLDER = '/var/cache/prdeployer/github/'  # responses with ETag/Last-Modified for conditional requests
+    GITHUB_REQUEST_TIMEOUT = 30  # seconds
+    GITHUB_RATE_LIMIT_RESERVE = 5  # wait for the rate limit reset when less requests are left
+    GITHUB_RATE_LIMIT_MAX_WAIT = 300  # seconds, fail instead of waiting longer
+    DB_SNAPSHOT_FOLDER = '/var/cache/prdeployer/db-snapshots/'  # catro:reset results, None to disable
+    DB_SNAPSHOT_MAX_COUNT = 5
+    DB_SNAPSHOT_FILES = ['public/resources']  # paths (relative to the repository root) created by catro:reset
+    BUILD_MANIFEST_FOLDER = '/var/cache/prdeployer/manifests/'
+    BUILD_STAGE_INPUTS = {  # paths (relative to the repository root) whose changes require rerunning a stage
+        'composer': ['composer.json', 'composer.lock'],
+        'npm': ['package.json', 'package-lock.json'],
+        'reset': ['migrations', 'fixtures', 'src/DataFixtures', 'src/System/Commands'],
+        'encore': ['assets', 'webpack.config.js', 'package.json', 'package-lock.json'],
+        'jwt': ['docker/app/init-jwt-config.sh', 'config/packages/lexik_jwt_authentication.yaml'],
+    }
+    SUBPROCESS_TIMEOUT = 1800  # seconds, default for every command, the process group is killed after it
+    STAGE_TIMEOUTS = {  # seconds, per build stage
+        'composer': 1200,
+        'npm': 1200,
+        'reset': 1800,
+        'encore': 900,
+        'jwt': 120,
+    }
+    STAGE_CGROUP_ROOT = '/sys/fs/cgroup/prdeployer/'  # cgroup v2 of the commands, None: no limits
+    STAGE_CGROUP_MEMORY_MAX = 8 * 1024 ** 3  # all commands together, None: unlimited
+    STAGE_CGROUP_CPU_WEIGHT = 50  # of all commands, relative to system.slice (100), i.e. the live deployments
+    STAGE_LIMITS = {  # per build stage, 'default' for all other commands: memory.max in bytes, cpu.weight
+        'composer': {'memory_max': 2 * 1024 ** 3, 'cpu_weight': 100},
+        'npm': {'memory_max': 3 * 1024 ** 3, 'cpu_weight': 100},
+        'encore': {'memory_max': 3 * 1024 ** 3, 'cpu_weight': 100},
+        'reset': {'memory_max': 2 * 1024 ** 3, 'cpu_weight': 100},
+        'cache': {'memory_max': 1024 ** 3, 'cpu_weight': 100},
+        'default': {'memory_max': 2 * 1024 ** 3, 'cpu_weight': 100},
+    }
+    ADMISSION_STAGES = ['composer', 'npm', 'encore', 'reset']  # wait for resources before these stages
+    ADMISSION_MAX_LOAD = 1.0  # load average per CPU
+    ADMISSION_MIN_AVAILABLE_BYTES = 2 * 1024 ** 3  # MemAvailable
+    ADMISSION_MAX_MEMORY_PRESSURE = 10.0  # percent, some avg10 of /proc/pressure/memory
+    ADMISSION_MAX_CPU_PRESSURE = 50.0  # percent, some avg10 of /proc/pressure/cpu
+    ADMISSION_MAX_WAIT = 600  # seconds, then the stage starts anyway
+    ADMISSION_POLL_INTERVAL = 5  # seconds
+    DEPLOYMENT_TIMEOUT = 3600  # seconds, overall budget of creating or updating one deployment
+    SUBPROCESS_OUTPUT_TAIL_BYTES = 8 * 1024  # last output of a failed command included in the error message
+    ACCESS_LOG_FOLDER = '/var/log/nginx/deployments/'  # one access log per label, its mtime is the last access
+    SUSPEND_IDLE_DAYS = 14  # suspend deployments neither accessed nor deployed for this long, None to disable
+    SUSPEND_TYPES = ['pr']
+    SUSPEND_FOLDER = '/var/cache/prdeployer/suspended/'  # database dumps of suspended deployments
+    SUSPEND_REMOVE_FOLDERS = ['vendor', 'node_modules']  # removed while suspended, reinstalled on wake-up
+    WAKE_REQUEST_FOLDER = '/var/www/index/wake/'  # wake.php of the index page creates a file per label here
+    WAKE_POLL_INTERVAL = 5  # seconds, daemon.py checks for wake requests this often
+    RUN_TIME_BUDGET = 600  # seconds, later work waits for the next run (cron runs every 15 minutes), None: no limit
+    SCHEDULER_DEFERRED_FILE = '/var/cache/prdeployer/deferred.json'  # labels left over by the last run go first
+    RETRY_BACKOFF_MINUTES = 15  # retry a commit after a network, disk or timeout failure after 15, 30, 60, ... minutes
+    RETRY_BACKOFF_MAX_MINUTES = 6 * 60
+    RETRY_MAX_ATTEMPTS = 8  # retries of the same commit, build failures (e.g. composer, encore) are not retried
+    WEBHOOK_HOST = '127.0.0.1'  # daemon.py, nginx forwards /webhook of the index site
+    WEBHOOK_PORT = 8088
+    WEBHOOK_SECRET = None  # secret of the GitHub webhook, requests are rejected without it
+    DAEMON_RECONCILE_INTERVAL = 3600  # seconds between full runs of the daemon to catch missed events
+    GC_REMOVE_ORPHANS = True  # remove resources of labels without a row in the deployment table, False: log only
+    GC_DISK_USAGE_SECONDS = 60  # time per run for measuring the disk usage of deployments, the rest waits
+    GC_DISK_USAGE_MAX_AGE_HOURS = 24
+    GC_MIN_FREE_BYTES = 10 * 1024 ** 3  # no deployment starts with less free space in the web folder, None: no check
+    STAGE_HISTORY_DAYS = 90  # keep the timings of deployment stages in the deployment_stage table this long
+    PROMETHEUS_TEXTFILE = None  # e.g. '/var/lib/prometheus/node-exporter/prdeployer.prom'
     LOG_FILE = '/var/log/catroweb_deployer.log'
     LABEL_LOG_FILE_DIRECTORY = '/var/www/index/logs/'
+    WARMUP_URLS = ['/app/']  # requested twice after every deployment (cold and warm time to first byte), []: none
+    WARMUP_ADDRESS = '127.0.0.1'  # nginx (HTTPS) serving the deployments of this host, the Host header selects the site
+    WARMUP_TIMEOUT = 120  # seconds for cache:warmup and for each smoke request
+    WARMUP_RELOAD_WAIT = 1  # seconds for nginx to load a new site before its smoke requests
+    STATUS_PAGE_FOLDER = '/var/www/index/'  # static index.html and status.json written by the deployer, None: disabled
+    STATUS_PAGE_URL_TEMPLATE = 'https://%s.web-test.catrobat.org/app/'  # url_template of the index page config
+    STATUS_PAGE_PROGRESS_INTERVAL = 2  # seconds, status.json is rewritten at most this often while stages run
+    LABEL_LOG_SEGMENT_BYTES = 4 * 1024 ** 2  # larger label logs continue in a new file, the full one is gzipped
+    LABEL_LOG_MAX_SEGMENTS = 10  # gzipped segments kept per label log, older output is removed
+    MAX_PARALLEL_DEPLOYMENTS = 4  # number of labels deployed at the same time
+    JOB_QUEUE = False  # the deployer only queues jobs in the deployment_job table, worker.py deploys them
+    HOST_NAME = socket.gethostname()  # name of this host in the deployment_host table and the host column
+    HOST_ADDRESS = None  # IP address (ip:port) the front end proxies the deployments of this host to, workers need it
+    JOB_LEASE_SECONDS = 120  # a job of a worker without heartbeat for this long is handed to the next worker
+    JOB_POLL_INTERVAL = 5  # seconds a worker waits when no job is queued
+    WORKER_HOUSEKEEPING_INTERVAL = 900  # seconds between the lifecycle and garbage collection runs of a worker
+    PLACEMENT_MAX_LOAD = 1.5  # new labels go to hosts below this load average per CPU, if there is one
+    PLACEMENT_RESERVED_BYTES = 3 * 1024 ** 3  # disk space accounted per label placed in the same run
+    NGINX_ROUTE_MAP = None  # nginx map file 'label address;' of the front end, written by the coordinator
     IGNORED_COMMITS = [
         '04aebd23f959aab4d7bf76609686f531cb3426b9',  # SHARE-000
     ]  # list of sha-1 commit hashes
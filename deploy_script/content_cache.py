@@ -0,0 +1,142 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+from typing import List, Tuple
+
+from file_lock import file_lock
+from logger import get_logger
+
+logger = get_logger()
+
+
+class ContentCache:
+    """
+    Directory cache for build outputs (e.g. vendor/, node_modules/), addressed by a hash of their inputs.
+
+    Entries are placed into deployments using hardlinks (``cp -al``) or copy-on-write copies
+    (``cp --reflink=auto``), therefore the files of an entry must never be modified in place.
+    The least recently used entries are evicted when the cache grows above its size budget. Restores, stores
+    and evictions are serialized by a lock file in the cache, which several worker processes may share.
+    """
+    SIZE_FILE = 'size'
+    DATA_FOLDER = 'data'
+
+    path: str
+    max_bytes: int
+    link_mode: str
+    _lock: threading.Lock
+
+    def __init__(self, path: str, max_bytes: int, link_mode: str = 'hardlink'):
+        if link_mode not in ('hardlink', 'copy'):
+            raise Exception(f"Invalid cache link mode {link_mode}")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.link_mode = link_mode
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(files: List[str], *extra: str) -> str:
+        """Hash the content of the files (missing files are hashed as missing) and additional strings."""
+        sha = hashlib.sha256()
+        for file in files:
+            sha.update(os.path.basename(file).encode('utf-8') + b'\0')
+            if os.path.isfile(file):
+                with open(file, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        sha.update(chunk)
+            else:
+                sha.update(b'<missing>')
+            sha.update(b'\0')
+        for value in extra:
+            sha.update(value.encode('utf-8') + b'\0')
+        return sha.hexdigest()
+
+    def restore(self, key: str, target: str) -> bool:
+        """Replace the target directory with the cache entry. Returns False on a cache miss."""
+        with file_lock(self._lock, self.path):
+            entry = os.path.join(self.path, key)
+            if not os.path.isdir(os.path.join(entry, self.DATA_FOLDER)):
+                return False
+            shutil.rmtree(target, ignore_errors=True)
+            self._copy(os.path.join(entry, self.DATA_FOLDER), target)
+            os.utime(entry)  # mark as recently used
+            return True
+
+    def detach(self, target: str):
+        """
+        Remove the target directory if any of its files is hardlinked to a cache entry,
+        so that package managers do not modify cached files in place.
+        """
+        for root, dirs, files in os.walk(target):
+            for name in files:
+                if os.lstat(os.path.join(root, name)).st_nlink > 1:
+                    logger.debug(f"Remove {target}, it is linked to the cache")
+                    shutil.rmtree(target, ignore_errors=True)
+                    return
+
+    def store(self, key: str, source: str):
+        """Add the source directory as entry for the key and evict old entries if necessary."""
+        with file_lock(self._lock, self.path):
+            entry = os.path.join(self.path, key)
+            if os.path.isdir(entry):
+                os.utime(entry)
+                return
+            tmp_entry = os.path.join(self.path, '.tmp-' + uuid.uuid4().hex)
+            try:
+                os.makedirs(tmp_entry)
+                self._copy(source, os.path.join(tmp_entry, self.DATA_FOLDER))
+                with open(os.path.join(tmp_entry, self.SIZE_FILE), 'w') as f:
+                    f.write(str(self._directory_size(os.path.join(tmp_entry, self.DATA_FOLDER))))
+                os.rename(tmp_entry, entry)
+            finally:
+                shutil.rmtree(tmp_entry, ignore_errors=True)
+            self._evict()
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, _, size in entries)
+        for entry, _, size in sorted(entries, key=lambda x: x[1]):
+            if total <= self.max_bytes:
+                break
+            logger.info(f"Evict cache entry {entry} ({size} bytes)")
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def _entries(self) -> List[Tuple[str, float, int]]:
+        entries = []
+        for name in os.listdir(self.path):
+            entry = os.path.join(self.path, name)
+            if name.startswith('.') or not os.path.isdir(entry):
+                continue
+            entries.append((entry, os.stat(entry).st_mtime, self._entry_size(entry)))
+        return entries
+
+    def _entry_size(self, entry: str) -> int:
+        try:
+            with open(os.path.join(entry, self.SIZE_FILE), 'r') as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return self._directory_size(entry)
+
+    def _copy(self, source: str, target: str):
+        if self.link_mode == 'hardlink':
+            command = ['cp', '-al', source, target]
+        else:
+            command = ['cp', '-a', '--reflink=auto', source, target]
+        p = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        if p.returncode != 0:
+            raise Exception(f"Failed to copy {source} to {target}: {p.stdout.decode('utf-8').strip()}")
+
+    @staticmethod
+    def _directory_size(path: str) -> int:
+        size = 0
+        for root, dirs, files in os.walk(path):
+            for name in files:
+                try:
+                    size += os.lstat(os.path.join(root, name)).st_size
+                except OSError:
+                    pass
+        return size
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Long-running alternative to the cron job: deploys on GitHub webhooks.
+
+GitHub sends ``pull_request`` and ``push`` events to ``http://<host>:<Config.WEBHOOK_PORT>/webhook``,
+signed with ``Config.WEBHOOK_SECRET`` (content type application/json). Events are queued per label,
+several pushes to the same pull request collapse into one deployment of the latest head.
+Every ``Config.DAEMON_RECONCILE_INTERVAL`` seconds a full ``Deployer.run()`` catches missed events.
+"""
+import hashlib
+import hmac
+import json
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Set, Tuple
+
+from config import Config
+from lifecycle import Lifecycle
+from logger import get_logger
+from prdeployer import Deployer
+
+logger = get_logger()
+
+PULL_REQUEST_ACTIONS = ['opened', 'reopened', 'synchronize', 'edited', 'labeled', 'unlabeled', 'closed']
+
+
+class DeploymentQueue:
+    """
+    Queue of pending events with at most one entry per label, a newer event replaces the pending one.
+
+    A label is never handed out twice at the same time. ``pause()`` stops handing out events and
+    waits until all events in progress are done, e.g. for the reconciliation run.
+    """
+    _pending: 'OrderedDict[str, Tuple[str, Any]]'
+    _in_progress: Set[str]
+    _paused: bool
+    _condition: threading.Condition
+
+    def __init__(self):
+        self._pending = OrderedDict()
+        self._in_progress = set()
+        self._paused = False
+        self._condition = threading.Condition()
+
+    def put(self, label: str, kind: str, payload: Any):
+        with self._condition:
+            if label in self._pending:
+                logger.info(f"Collapse pending {self._pending[label][0]} event of {label} into the new one")
+            self._pending[label] = (kind, payload)
+            self._condition.notify_all()
+
+    def contains(self, label: str) -> bool:
+        """Whether an event of the label is pending or in progress."""
+        with self._condition:
+            return label in self._pending or label in self._in_progress
+
+    def get(self) -> Tuple[str, str, Any]:
+        with self._condition:
+            while True:
+                label = self._next_label()
+                if label is not None:
+                    kind, payload = self._pending.pop(label)
+                    self._in_progress.add(label)
+                    return label, kind, payload
+                self._condition.wait()
+
+    def done(self, label: str):
+        with self._condition:
+            self._in_progress.discard(label)
+            self._condition.notify_all()
+
+    def pause(self):
+        with self._condition:
+            self._paused = True
+            while self._in_progress:
+                self._condition.wait()
+
+    def resume(self):
+        with self._condition:
+            self._paused = False
+            self._condition.notify_all()
+
+    def _next_label(self) -> Optional[str]:
+        if self._paused:
+            return None
+        for label in self._pending:
+            if label not in self._in_progress:
+                return label
+        return None
+
+
+class WebhookDaemon:
+    deployer: Deployer
+    queue: DeploymentQueue
+    _server: ThreadingHTTPServer
+
+    def __init__(self):
+        self.deployer = Deployer()
+        self.queue = DeploymentQueue()
+        daemon = self
+
+        class Handler(WebhookRequestHandler):
+            webhook_daemon = daemon
+
+        self._server = ThreadingHTTPServer((Config.WEBHOOK_HOST, Config.WEBHOOK_PORT), Handler)
+
+    def run(self):
+        logger.info(f"Webhook daemon listening on {Config.WEBHOOK_HOST}:{Config.WEBHOOK_PORT}")
+        for i in range(max(1, Config.MAX_PARALLEL_DEPLOYMENTS)):
+            threading.Thread(target=self._dispatch, name=f'deploy_{i}', daemon=True).start()
+        threading.Thread(target=self._reconcile, name='reconcile', daemon=True).start()
+        threading.Thread(target=self._watch_wake_requests, name='wake', daemon=True).start()
+        self._server.serve_forever()
+
+    def handle_event(self, event: str, payload: Dict[str, Any]) -> bool:
+        """Queue the webhook event, returns False if the event is not relevant for the deployer."""
+        if event == 'pull_request' and payload.get('action') in PULL_REQUEST_ACTIONS:
+            pr = payload['pull_request']
+            self.queue.put('pr' + str(int(pr['number'])), 'pull_request', (pr, payload['action'] == 'closed'))
+            return True
+        if event == 'push' and payload.get('ref', '').startswith('refs/heads/') and not payload.get('deleted'):
+            branch = payload['ref'][len('refs/heads/'):]
+            self.queue.put('branch:' + branch, 'push', branch)
+            return True
+        return False
+
+    def _dispatch(self):
+        while True:
+            label, kind, payload = self.queue.get()
+            logger.info(f"Handle {kind} event of {label}")
+            try:
+                if kind == 'pull_request':
+                    self.deployer.run_worker_task(self.deployer.process_pull_request_event, *payload)
+                elif kind == 'wake':
+                    self.deployer.run_worker_task(self.deployer.process_wake_request, label)
+                else:
+                    self.deployer.run_worker_task(self.deployer.process_branch_push, payload)
+                self.deployer.nginx.request_reload()
+            except Exception as e:
+                logger.error(e)
+            finally:
+                self.queue.done(label)
+
+    def _watch_wake_requests(self):
+        # the request file is removed once handled, until then it must not be queued again
+        while True:
+            for label in Lifecycle.wake_requests():
+                if not self.queue.contains(label):
+                    self.queue.put(label, 'wake', None)
+            time.sleep(Config.WAKE_POLL_INTERVAL)
+
+    def _reconcile(self):
+        while True:
+            logger.info("Reconcile deployments with GitHub")
+            self.queue.pause()
+            try:
+                self.deployer.run()
+            except Exception as e:
+                logger.error(e)
+            finally:
+                self.queue.resume()
+            time.sleep(Config.DAEMON_RECONCILE_INTERVAL)
+
+
+class WebhookRequestHandler(BaseHTTPRequestHandler):
+    webhook_daemon: WebhookDaemon
+
+    def log_message(self, format, *args):
+        logger.debug("Webhook request: " + format % args)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/webhook':
+            return self._respond(404)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self.verify_signature(body, self.headers.get('X-Hub-Signature-256', '')):
+            logger.warning("Reject webhook request with invalid signature")
+            return self._respond(401)
+        event = self.headers.get('X-GitHub-Event', '')
+        if event == 'ping':
+            return self._respond(200)
+        try:
+            payload = json.loads(body.decode('utf-8'))
+        except ValueError:
+            return self._respond(400)
+        accepted = self.webhook_daemon.handle_event(event, payload)
+        self._respond(202 if accepted else 204)
+
+    @staticmethod
+    def verify_signature(body: bytes, signature: str) -> bool:
+        if not Config.WEBHOOK_SECRET:
+            return False
+        expected = 'sha256=' + hmac.new(Config.WEBHOOK_SECRET.encode('utf-8'), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature)
+
+    def _respond(self, status: int):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+if __name__ == '__main__':
+    WebhookDaemon().run()
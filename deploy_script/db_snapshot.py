@@ -0,0 +1,121 @@
+import os
+import shutil
+import threading
+import uuid
+from typing import Callable, Dict, List, Tuple
+
+from config import Config
+from file_lock import file_lock
+from logger import get_logger
+
+logger = get_logger()
+
+
+def dump_database(run_subprocess: Callable, database: str, path: str, label: str):
+    """
+    Write a gzipped dump of the database, without CREATE DATABASE/USE so that it loads into any database.
+    Routines and triggers are left out (the Doctrine schema has none) and DEFINER clauses (of views) are
+    removed, they would refer to the user of the dumped label in the databases of other labels.
+    """
+    run_subprocess(["bash", "-o", "pipefail", "-c",
+                    "mysqldump -u \"$1\" --single-transaction --skip-triggers --hex-blob --no-tablespaces \"$2\" "
+                    "| sed -e 's/DEFINER=`[^`]*`@`[^`]*`//g' | gzip -1 > \"$0\"", path, Config.MYSQL_USER, database],
+                   label, "dump database", env=_mysql_env())
+
+
+def load_database(run_subprocess: Callable, database: str, path: str, label: str):
+    """Replace the database with an empty one and load the gzipped dump into it."""
+    # the grants of the label user are kept when its database is dropped
+    run_subprocess(["mysql", "-u", Config.MYSQL_USER, "-e",
+                    f"DROP DATABASE IF EXISTS `{database}`; CREATE DATABASE `{database}`"],
+                   label, "recreate database", env=_mysql_env())
+    run_subprocess(["bash", "-o", "pipefail", "-c", 'gzip -dc "$0" | mysql -u "$1" "$2"',
+                    path, Config.MYSQL_USER, database],
+                   label, "load database dump", env=_mysql_env())
+
+
+def _mysql_env() -> Dict[str, str]:
+    # keeps the password out of the process list
+    return {'MYSQL_PWD': Config.MYSQL_PASSWORD}
+
+
+class DatabaseSnapshots:
+    """
+    Seed snapshots of the state created by ``catro:reset --hard``, addressed by the hash of the reset stage
+    (migrations and fixtures, see ``Config.BUILD_STAGE_INPUTS``).
+
+    A snapshot is a ``mysqldump`` of the database of the label which ran the reset, plus a tar archive of
+    the files created by the reset (``Config.DB_SNAPSHOT_FILES``). Restoring it into another label replaces
+    its database and files. Only the most recently used ``max_count`` snapshots are kept.
+    """
+    DUMP_FILE = 'database.sql.gz'
+    FILES_ARCHIVE = 'files.tar.gz'
+
+    path: str
+    max_count: int
+    _run_subprocess: Callable
+    _lock: threading.Lock
+
+    def __init__(self, run_subprocess: Callable, path: str = Config.DB_SNAPSHOT_FOLDER,
+                 max_count: int = Config.DB_SNAPSHOT_MAX_COUNT):
+        self.path = path
+        self.max_count = max_count
+        self._run_subprocess = run_subprocess
+        self._lock = threading.Lock()
+
+    def restore(self, key: str, label: str, git_folder: str) -> bool:
+        """Replace the database and reset files of the label with the snapshot. Returns False on a miss."""
+        entry = os.path.join(self.path, key)
+        if not os.path.isfile(os.path.join(entry, self.DUMP_FILE)):
+            return False
+        os.utime(entry)  # mark as recently used, before the eviction of a concurrent save can remove it
+
+        load_database(self._run_subprocess, label, os.path.join(entry, self.DUMP_FILE), label)
+
+        for path in Config.DB_SNAPSHOT_FILES:
+            shutil.rmtree(os.path.join(git_folder, path), ignore_errors=True)
+        if os.path.isfile(os.path.join(entry, self.FILES_ARCHIVE)):
+            # runs as root, so the owner (www-data) of the archived files is restored as well
+            self._run_subprocess(["tar", "-xzf", os.path.join(entry, self.FILES_ARCHIVE), "-C", git_folder],
+                                 label, "extract files of database snapshot")
+        return True
+
+    def save(self, key: str, label: str, git_folder: str):
+        """Save the database and reset files of the label as snapshot for the key."""
+        entry = os.path.join(self.path, key)
+        if os.path.isdir(entry):
+            os.utime(entry)
+            return
+        os.makedirs(self.path, exist_ok=True)
+        tmp_entry = os.path.join(self.path, '.tmp-' + uuid.uuid4().hex)
+        try:
+            os.makedirs(tmp_entry)
+            dump_database(self._run_subprocess, label, os.path.join(tmp_entry, self.DUMP_FILE), label)
+            paths = [path for path in Config.DB_SNAPSHOT_FILES if os.path.exists(os.path.join(git_folder, path))]
+            if paths:
+                self._run_subprocess(["tar", "-czf", os.path.join(tmp_entry, self.FILES_ARCHIVE),
+                                      "-C", git_folder, "--"] + paths,
+                                     label, "archive files of database snapshot")
+            with file_lock(self._lock, self.path):
+                if os.path.isdir(entry):  # saved by another worker in the meantime
+                    return
+                os.rename(tmp_entry, entry)
+                logger.info(f"Saved database snapshot {key[:12]} of {label}")
+                self._evict()
+        finally:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+
+    def _evict(self):
+        entries = self._entries()
+        for entry, _ in sorted(entries, key=lambda x: x[1])[:max(0, len(entries) - self.max_count)]:
+            logger.info(f"Evict database snapshot {entry}")
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def _entries(self) -> List[Tuple[str, float]]:
+        entries = []
+        for name in os.listdir(self.path):
+            entry = os.path.join(self.path, name)
+            if name.startswith('.') or not os.path.isdir(entry):
+                continue
+            entries.append((entry, os.stat(entry).st_mtime))
+        return entries
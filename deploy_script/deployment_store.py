@@ -0,0 +1,197 @@
+import threading
+from datetime import datetime
+from typing import Any, Collection, Dict, List, Optional, Tuple
+
+import pymysql
+
+from logger import get_logger
+
+logger = get_logger()
+
+
+class DeploymentStore:
+    """
+    In-memory copy of the ``deployment.deployment`` table.
+
+    The whole table is loaded with one query. Status changes are applied to the in-memory rows
+    immediately and written to the database in one transaction by ``flush()``. The pending changes are kept per
+    label, so that the threads of the daemon only write the changes of the labels they handle, and a ``load()``
+    keeps the in-memory rows of labels with pending changes.
+    """
+    rows: Dict[str, Dict[str, Any]]
+    # (label, changes the row, query, params)
+    _pending: List[Tuple[Optional[str], bool, str, tuple]]
+    _lock: threading.Lock
+
+    def __init__(self):
+        self.rows = {}
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def load(self, connection: pymysql.Connection):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT * FROM deployment.deployment")
+            rows = {row['label']: row for row in cursor.fetchall()}
+        connection.commit()  # end the transaction, the next load must see new rows
+        with self._lock:
+            # the database does not have the pending changes of other threads yet
+            for label in {label for label, changes_row, _, _ in self._pending if changes_row}:
+                if label in self.rows:
+                    rows[label] = self.rows[label]
+                else:
+                    rows.pop(label, None)
+            self.rows = rows
+        logger.debug(f"Loaded {len(rows)} deployments from database")
+
+    def refresh(self, connection: pymysql.Connection, label: str):
+        """Load the current row of a single label, e.g. changed by another host."""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT * FROM deployment.deployment WHERE `label` = %s", (label,))
+            row = cursor.fetchone()
+        connection.commit()
+        with self._lock:
+            if row is None:
+                self.rows.pop(label, None)
+            else:
+                self.rows[label] = row
+
+    def get(self, label: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self.rows.get(label)
+
+    def labels(self, deployment_type: str) -> List[str]:
+        with self._lock:
+            return [label for label, row in self.rows.items() if row['type'] == deployment_type]
+
+    def all_rows(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self.rows.values())
+
+    def by_type(self, deployment_type: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [row for row in self.rows.values() if row['type'] == deployment_type]
+
+    def mark_deployed(self, data, db_entry_exists: bool):
+        if db_entry_exists:
+            self._queue(data.label, {'source_branch': data.source_branch, 'source_sha': data.source_sha,
+                                     'title': data.title, 'fail_count': 0, 'deployed_at': datetime.now(),
+                                     'failure_class': None, 'next_retry_at': None},
+                        "UPDATE deployment.deployment "
+                        "SET `source_branch` = %s, `source_sha` = %s, `deployed_at` = CURRENT_TIMESTAMP , "
+                        "`title` = %s, `fail_count` = 0, `failure_class` = NULL, `next_retry_at` = NULL "
+                        "WHERE `label` = %s",
+                        (data.source_branch, data.source_sha, data.title, data.label,))
+        else:
+            self._queue(data.label, self._new_row(data, 0),
+                        "INSERT INTO deployment.deployment(`label`, `type`, `source_branch`, `source_sha`, "
+                        "`deployed_at`, `title`, `url`, `author`) "
+                        "VALUES(%s, %s, %s, %s, CURRENT_TIMESTAMP, %s, %s, %s)",
+                        (data.label, data.type.value, data.source_branch, data.source_sha, data.title, data.url,
+                         data.author,))
+
+    def mark_failed(self, data, fail_count: int, failure_class: str = None, next_retry_at: datetime = None):
+        row = dict(self._new_row(data, fail_count), failure_class=failure_class, next_retry_at=next_retry_at)
+        self._queue(data.label, row,
+                    "INSERT INTO deployment.deployment(`label`, `type`, `source_branch`, `source_sha`, "
+                    "`deployed_at`, `title`, `url`, `author`, `fail_count`, `failure_class`, `next_retry_at`) "
+                    "VALUES(%s, %s, %s, %s, CURRENT_TIMESTAMP, %s, %s, %s, %s, %s, %s) "
+                    "ON DUPLICATE KEY UPDATE `source_branch` = %s, `source_sha` = %s, "
+                    "`deployed_at` = CURRENT_TIMESTAMP, `title` = %s, `fail_count` = %s, `failure_class` = %s, "
+                    "`next_retry_at` = %s",
+                    (data.label, data.type.value, data.source_branch, data.source_sha, data.title, data.url,
+                     data.author, int(fail_count), failure_class, next_retry_at,
+                     data.source_branch, data.source_sha, data.title, int(fail_count), failure_class,
+                     next_retry_at))
+
+    def record_access(self, label: str, last_access_at):
+        self._queue(label, {'last_access_at': last_access_at},
+                    "UPDATE deployment.deployment SET `last_access_at` = %s WHERE `label` = %s",
+                    (last_access_at, label,))
+
+    def mark_suspended(self, label: str, suspended_bytes: int):
+        self._queue(label, {'suspended_at': datetime.now(), 'suspended_bytes': suspended_bytes},
+                    "UPDATE deployment.deployment SET `suspended_at` = CURRENT_TIMESTAMP, `suspended_bytes` = %s "
+                    "WHERE `label` = %s",
+                    (suspended_bytes, label,))
+
+    def mark_resumed(self, label: str):
+        # counts as access, otherwise the deployment would be suspended again by the next run
+        self._queue(label, {'suspended_at': None, 'suspended_bytes': None, 'last_access_at': datetime.now()},
+                    "UPDATE deployment.deployment SET `suspended_at` = NULL, `suspended_bytes` = NULL, "
+                    "`last_access_at` = CURRENT_TIMESTAMP WHERE `label` = %s",
+                    (label,))
+
+    def record_disk_usage(self, label: str, disk_bytes: int, database_bytes: int):
+        self._queue(label, {'disk_bytes': disk_bytes, 'database_bytes': database_bytes,
+                            'disk_measured_at': datetime.now()},
+                    "UPDATE deployment.deployment SET `disk_bytes` = %s, `database_bytes` = %s, "
+                    "`disk_measured_at` = CURRENT_TIMESTAMP WHERE `label` = %s",
+                    (disk_bytes, database_bytes, label,))
+
+    def record_warm_up(self, label: str, healthy: bool, cold_ttfb_ms: Optional[int], warm_ttfb_ms: Optional[int]):
+        self._queue(label, {'healthy': int(healthy), 'cold_ttfb_ms': cold_ttfb_ms, 'warm_ttfb_ms': warm_ttfb_ms},
+                    "UPDATE deployment.deployment SET `healthy` = %s, `cold_ttfb_ms` = %s, `warm_ttfb_ms` = %s "
+                    "WHERE `label` = %s",
+                    (int(healthy), cold_ttfb_ms, warm_ttfb_ms, label,))
+
+    def record_host(self, label: str, host: str):
+        self._queue(label, {'host': host},
+                    "UPDATE deployment.deployment SET `host` = %s WHERE `label` = %s",
+                    (host, label,))
+
+    def remove(self, label: str):
+        self._queue(label, None, "DELETE FROM deployment.deployment WHERE label = %s", (label,))
+
+    def add_stage_timings(self, timings):
+        """Queue StageTimings for the deployment_stage history table."""
+        with self._lock:
+            for timing in timings:
+                self._pending.append((
+                    timing.label, False,
+                    "INSERT INTO deployment.deployment_stage(`label`, `source_sha`, `stage`, `started_at`, "
+                    "`wall_seconds`, `cpu_seconds`, `max_rss_kb`, `peak_memory_kb`, `success`) "
+                    "VALUES(%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                    (timing.label, timing.source_sha, timing.stage, timing.started_at, timing.wall_seconds,
+                     timing.cpu_seconds, timing.max_rss_kb, timing.peak_memory_kb, int(timing.success))))
+
+    def prune_stage_timings(self, days: int):
+        with self._lock:
+            self._pending.append((None, False, "DELETE FROM deployment.deployment_stage "
+                                               "WHERE `started_at` < CURRENT_TIMESTAMP - INTERVAL %s DAY",
+                                  (int(days),)))
+
+    def flush(self, connection: pymysql.Connection, labels: Optional[Collection[str]] = None):
+        """
+        Write the pending changes of the labels (all if None) in one transaction, they stay pending if it fails.
+        """
+        with self._lock:
+            pending = [entry for entry in self._pending if labels is None or entry[0] in labels]
+            self._pending = [entry for entry in self._pending if labels is not None and entry[0] not in labels]
+        if not pending:
+            return
+        logger.info(f"Write {len(pending)} deployment status change(s) to database")
+        try:
+            with connection.cursor() as cursor:
+                for _, _, query, params in pending:
+                    cursor.execute(query, params)
+            connection.commit()
+        except Exception as e:
+            connection.rollback()
+            with self._lock:
+                self._pending = pending + self._pending
+            logger.error(f"Failed to write deployment status changes: {e}")
+            raise
+
+    def _queue(self, label: str, row: Optional[Dict[str, Any]], query: str, params: tuple):
+        with self._lock:
+            if row is None:
+                self.rows.pop(label, None)
+            else:
+                self.rows.setdefault(label, {'label': label}).update(row)
+            self._pending.append((label, True, query, params))
+
+    @staticmethod
+    def _new_row(data, fail_count: int) -> Dict[str, Any]:
+        return {'label': data.label, 'type': data.type.value, 'source_branch': data.source_branch,
+                'source_sha': data.source_sha, 'title': data.title, 'url': data.url, 'author': data.author,
+                'fail_count': fail_count, 'deployed_at': datetime.now()}
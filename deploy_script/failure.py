@@ -0,0 +1,85 @@
+import errno
+import re
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Optional
+
+from config import Config
+from subprocess_runner import SubprocessError
+
+
+class FailureClass(Enum):
+    NETWORK = 'network'  # GitHub, a package registry or the network itself was not reachable
+    DISK = 'disk'  # out of disk space or quota
+    TIMEOUT = 'timeout'
+    BUILD = 'build'  # the commit does not build: install, compile, migration or fixture errors
+    UNKNOWN = 'unknown'
+    ROLLBACK = 'rollback'  # the release was rolled back by hand, see Deployer.rollback_deployment()
+
+
+# failures which may go away without a new commit
+TRANSIENT_FAILURES = [FailureClass.NETWORK, FailureClass.DISK, FailureClass.TIMEOUT, FailureClass.UNKNOWN]
+
+_DISK_PATTERN = re.compile(r'No space left on device|ENOSPC|Disk quota exceeded|EDQUOT|Errcode: 28|errno 28',
+                           re.IGNORECASE)
+_NETWORK_PATTERN = re.compile('|'.join([
+    r'Could not resolve host',
+    r'Temporary failure in name resolution',
+    r'getaddrinfo',
+    r'EAI_AGAIN|ECONNRESET|ECONNREFUSED|ETIMEDOUT|EHOSTUNREACH|ENETUNREACH',
+    r'socket hang up',
+    r'Connection (timed out|refused|reset)',
+    r'Operation timed out',
+    r'Network is unreachable',
+    r'The remote end hung up unexpectedly',
+    r'early EOF',
+    r'curl error \d+',
+    r'SSL connect error|TLS handshake',
+    r'50[234] (Bad Gateway|Service Unavailable|Gateway Time-?out)',
+    r'npm ERR! network',
+    r'file could not be downloaded',  # composer
+]), re.IGNORECASE)
+# stages whose failure without a known pattern is caused by the network, respectively by the commit
+_NETWORK_STAGES = re.compile(r'fetch|remote')
+_BUILD_STAGES = re.compile(r'composer|npm|encore|catro:reset|jwt|Symfony cache|git checkout|find commit')
+
+
+def classify_failure(e: BaseException) -> FailureClass:
+    """Classify a failed deployment by the failed command (stage, exit code, output) or the error."""
+    text = str(e)
+    while e is not None:
+        if isinstance(e, SubprocessError):
+            return _classify_subprocess_error(e, text)
+        if isinstance(e, OSError) and e.errno in (errno.ENOSPC, errno.EDQUOT):
+            return FailureClass.DISK
+        e = e.__cause__ or e.__context__
+    if _DISK_PATTERN.search(text):
+        return FailureClass.DISK
+    if _NETWORK_PATTERN.search(text):
+        return FailureClass.NETWORK
+    return FailureClass.UNKNOWN
+
+
+def _classify_subprocess_error(e: SubprocessError, text: str) -> FailureClass:
+    output = e.output_tail + '\n' + text
+    if _DISK_PATTERN.search(output):
+        return FailureClass.DISK
+    if _NETWORK_PATTERN.search(output):
+        return FailureClass.NETWORK
+    if e.timed_out:
+        return FailureClass.TIMEOUT
+    stage = e.stage or ''
+    if _NETWORK_STAGES.search(stage):
+        return FailureClass.NETWORK
+    if e.exit_code is not None and e.exit_code > 0 and _BUILD_STAGES.search(stage):
+        return FailureClass.BUILD
+    # e.g. killed by a signal (out of memory)
+    return FailureClass.UNKNOWN
+
+
+def next_retry_at(failure: FailureClass, fail_count: int, now: datetime = None) -> Optional[datetime]:
+    """When to retry the same commit after its fail_count-th failure, None to wait for a new commit."""
+    if failure not in TRANSIENT_FAILURES or fail_count > Config.RETRY_MAX_ATTEMPTS:
+        return None
+    minutes = min(Config.RETRY_BACKOFF_MINUTES * 2 ** (fail_count - 1), Config.RETRY_BACKOFF_MAX_MINUTES)
+    return (now or datetime.now()) + timedelta(minutes=minutes)
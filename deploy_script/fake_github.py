@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the GitHub API which serves recorded responses, to run the deployer offline.
+
+Usage: python3 fake_github.py [fixture.json] [port]
+and set ``Config.GITHUB_API_URL = 'http://127.0.0.1:<port>'`` and
+``Config.GITHUB_GRAPHQL_URL = 'http://127.0.0.1:<port>/graphql'``.
+
+The fixture contains the REST API v3 responses: ``{"pulls": [...], "branches": {"<name>": {...}}}``.
+Both the REST endpoints used by the deployer and the GraphQL query of ``GitHubGraphQLBackend`` are
+answered from it. ``GET /_stats`` returns the number of answered requests.
+"""
+import base64
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+class FakeGitHubServer:
+    fixture: Dict[str, Any]
+    stats: Dict[str, int]
+    _server: ThreadingHTTPServer
+    _thread: threading.Thread
+
+    def __init__(self, fixture: Dict[str, Any], host: str = '127.0.0.1', port: int = 0):
+        self.fixture = fixture
+        self.stats = {'requests': 0, 'rest': 0, 'graphql': 0, 'not_modified': 0}
+        self._stats_lock = threading.Lock()
+        server = self
+
+        class Handler(FakeGitHubRequestHandler):
+            fake = server
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'FakeGitHubServer':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def count(self, kind: str, request: bool = True):
+        with self._stats_lock:
+            if request:
+                self.stats['requests'] += 1
+            self.stats[kind] += 1
+
+    def graphql(self, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        offset = int(variables.get('cursor') or 0)
+        pulls = self.fixture.get('pulls', [])
+        page = pulls[offset:offset + 100]
+        repository = {
+            'pullRequests': {
+                'pageInfo': {'hasNextPage': offset + 100 < len(pulls), 'endCursor': str(offset + 100)},
+                'nodes': [self._pull_request_node(pr) for pr in page],
+            }
+        }
+        for alias, branch in re.findall(r'(\w+): ref\(qualifiedName: "refs/heads/([^"]+)"\)', query):
+            result = self.fixture.get('branches', {}).get(branch)
+            repository[alias] = None if result is None else {'target': {
+                'oid': result['commit']['sha'],
+                'message': result['commit']['commit']['message'],
+                'author': {'name': result['commit']['commit']['author']['name']},
+            }}
+        return {'data': {'repository': repository}}
+
+    @staticmethod
+    def _pull_request_node(pr: Dict[str, Any]) -> Dict[str, Any]:
+        repo = pr['head']['repo']
+        return {
+            'number': pr['number'],
+            'title': pr['title'],
+            'url': pr['html_url'],
+            'author': {'login': pr['user']['login']},
+            'headRefName': pr['head']['ref'],
+            'headRefOid': pr['head']['sha'],
+            'headRepository': None if repo is None else {'url': re.sub(r'\.git$', '', repo['clone_url'])},
+            'labels': {'nodes': [{'id': base64.b64encode(f"05:Label{label['id']}".encode('utf-8')).decode('utf-8'),
+                                  'name': label['name']} for label in pr.get('labels', [])]},
+        }
+
+
+class FakeGitHubRequestHandler(BaseHTTPRequestHandler):
+    fake: FakeGitHubServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/_stats':
+            return self._send_json(self.fake.stats)
+
+        self.fake.count('rest')
+        matches = re.match(r'^/repos/[^/]+/[^/]+/(pulls|branches/(.+))$', url.path)
+        if matches is None:
+            return self._send_json({'message': 'Not Found'}, 404)
+        if matches.group(1) == 'pulls':
+            per_page = int(query.get('per_page', ['30'])[0])
+            page = int(query.get('page', ['1'])[0])
+            pulls = self.fake.fixture.get('pulls', [])
+            headers = {}
+            if page * per_page < len(pulls):
+                next_query = dict((key, values[0]) for key, values in query.items())
+                next_query['page'] = str(page + 1)
+                next_url = f"http://{self.headers['Host']}{url.path}?" + \
+                           '&'.join(f'{key}={value}' for key, value in next_query.items())
+                headers['Link'] = f'<{next_url}>; rel="next"'
+            return self._send_json(pulls[(page - 1) * per_page:page * per_page], headers=headers)
+
+        branch = self.fake.fixture.get('branches', {}).get(unquote(matches.group(2)))
+        if branch is None:
+            return self._send_json({'message': 'Branch not found'}, 404)
+        return self._send_json(branch)
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/graphql':
+            return self._send_json({'message': 'Not Found'}, 404)
+        self.fake.count('graphql')
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+        return self._send_json(self.fake.graphql(request['query'], request.get('variables') or {}))
+
+    def _send_json(self, data, status: int = 200, headers: Dict[str, str] = None):
+        body = json.dumps(data).encode('utf-8')
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if status == 200 and self.command == 'GET' and self.headers.get('If-None-Match') == etag:
+            self.fake.count('not_modified', request=False)
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+if __name__ == '__main__':
+    fixture_file = sys.argv[1] if len(sys.argv) > 1 else \
+        os.path.join(os.path.dirname(os.path.realpath(__file__)), 'fixtures', 'github.json')
+    with open(fixture_file, 'r') as f:
+        fake_server = FakeGitHubServer(json.load(f), port=int(sys.argv[2]) if len(sys.argv) > 2 else 8765)
+    print(f"Serving {fixture_file} on {fake_server.url}")
+    fake_server.serve_forever()
@@ -0,0 +1,20 @@
+import fcntl
+import os
+import threading
+from contextlib import contextmanager
+
+
+@contextmanager
+def file_lock(thread_lock: threading.Lock, folder: str, name: str = '.lock'):
+    """
+    Exclusive lock of a shared folder, for the threads of this process (thread_lock) and for other processes
+    (``flock`` on a lock file in the folder), e.g. several workers on one machine sharing the caches.
+    """
+    with thread_lock:
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, name), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,197 @@
+import os
+import re
+import shutil
+import time
+from datetime import datetime, timedelta
+from typing import List, Set
+
+import pymysql
+from build_manifest import BuildManifest
+from config import Config
+from deployment_store import DeploymentStore
+from job_queue import is_local
+from lifecycle import Lifecycle
+from logger import get_logger
+from nginx_sites import NginxSites
+from releases import Releases
+
+logger = get_logger()
+
+
+class InsufficientDiskSpaceException(Exception):
+    pass
+
+
+class GarbageCollector:
+    """
+    Reconciles the resources of the deployments with the ``deployment`` table and measures their size.
+
+    Web folders, releases, databases, MariaDB users, nginx sites and log files of labels without a row are
+    orphans, e.g. left behind by a crash in the middle of a deployment, and are removed. Databases and
+    users only count as created by the deployer if they are named like a pull request label or the user
+    has all privileges on the database of the same name; nginx sites only if they refer to the web folder
+    or the access log of the label. It must only run while no deployment is in progress.
+
+    The disk usage of the labels is walked incrementally: only labels deployed since their last
+    measurement or measured longer than ``Config.GC_DISK_USAGE_MAX_AGE_HOURS`` ago, as many as fit into
+    ``Config.GC_DISK_USAGE_SECONDS``.
+    """
+    SYSTEM_DATABASES = ['information_schema', 'mysql', 'performance_schema', 'sys', 'deployment']
+    LABEL_PATTERN = re.compile(r'pr\d+')
+
+    store: DeploymentStore
+    nginx: NginxSites
+
+    def __init__(self, store: DeploymentStore, nginx: NginxSites):
+        self.store = store
+        self.nginx = nginx
+
+    @staticmethod
+    def check_free_space():
+        """Raises InsufficientDiskSpaceException if a deployment must not start."""
+        if not Config.GC_MIN_FREE_BYTES:
+            return
+        for path in (Config.WEB_FOLDER, Config.DEPENDENCY_CACHE_FOLDER):
+            if not os.path.isdir(path):
+                continue
+            free = shutil.disk_usage(path).free
+            if free < Config.GC_MIN_FREE_BYTES:
+                raise InsufficientDiskSpaceException(f"Only {free // 1024 ** 2} MiB free in {path}, deployments "
+                                                     f"need at least {Config.GC_MIN_FREE_BYTES // 1024 ** 2} MiB")
+
+    def remove_orphans(self, connection: pymysql.Connection, in_progress: Set[str] = frozenset()):
+        """
+        Remove the resources of labels without a row, except in_progress: labels whose first deployment may be
+        running elsewhere (multi-host mode, their row is only written once it finished).
+        """
+        labels = set(row['label'] for row in self.store.all_rows())
+        if not labels:
+            # an empty (e.g. newly created) table would make every deployment an orphan
+            logger.warning("Skip the removal of orphaned deployments, the deployment table is empty")
+            return
+        labels |= in_progress
+        self._remove_orphaned_folders(labels)
+        self._remove_orphaned_databases(connection, labels)
+        self._remove_orphaned_sites(labels)
+        self._remove_orphaned_files(labels)
+
+    def measure_disk_usage(self, connection: pymysql.Connection):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT `table_schema` AS name, SUM(`data_length` + `index_length`) AS size "
+                           "FROM information_schema.tables GROUP BY `table_schema`")
+            database_sizes = {row['name']: int(row['size'] or 0) for row in cursor.fetchall()}
+        connection.commit()
+
+        now = datetime.now()
+        max_age = timedelta(hours=Config.GC_DISK_USAGE_MAX_AGE_HOURS)
+        stale = []
+        for row in filter(is_local, self.store.all_rows()):
+            measured_at = row.get('disk_measured_at')
+            if measured_at is None or now - measured_at > max_age or \
+                    (row.get('deployed_at') is not None and row['deployed_at'] > measured_at):
+                stale.append(row)
+            elif row.get('database_bytes') != database_sizes.get(row['label'], 0):
+                # cheap, does not need a walk
+                self.store.record_disk_usage(row['label'], row.get('disk_bytes') or 0,
+                                             database_sizes.get(row['label'], 0))
+
+        deadline = time.monotonic() + Config.GC_DISK_USAGE_SECONDS
+        stale.sort(key=lambda r: r.get('disk_measured_at') or datetime.min)
+        for row in stale:
+            if time.monotonic() > deadline:
+                logger.info(f"Disk usage of {len(stale) - stale.index(row)} label(s) is measured in the next run")
+                break
+            folder = Releases.folder(row['label'])
+            disk_bytes = Lifecycle.unshared_size(folder if os.path.isdir(folder) else Releases.link(row['label']))
+            self.store.record_disk_usage(row['label'], disk_bytes, database_sizes.get(row['label'], 0))
+
+    def _remove_orphaned_folders(self, labels: Set[str]):
+        for name in self._list(Config.WEB_FOLDER):
+            path = os.path.join(Config.WEB_FOLDER, name)
+            if name in labels:
+                continue
+            if os.path.islink(path):
+                # links to releases, also the temporary link of an interrupted activation
+                if os.readlink(path).startswith(Config.RELEASES_FOLDER):
+                    self._remove(f"release link {path}", os.unlink, path)
+            elif os.path.isdir(path):
+                self._remove(f"web folder {path}", shutil.rmtree, path)
+        for name in self._list(Config.RELEASES_FOLDER):
+            path = os.path.join(Config.RELEASES_FOLDER, name)
+            if name not in labels and os.path.isdir(path):
+                self._remove(f"releases {path}", shutil.rmtree, path)
+        for name in self._list(Config.BUILD_MANIFEST_FOLDER):
+            if name.endswith('.json') and name[:-len('.json')] not in labels:
+                self._remove(f"build manifest {name}", BuildManifest.delete, name[:-len('.json')])
+
+    def _remove_orphaned_databases(self, connection: pymysql.Connection, labels: Set[str]):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT `schema_name` AS name FROM information_schema.schemata")
+            databases = [row['name'] for row in cursor.fetchall()]
+            cursor.execute("SELECT `User` AS user FROM mysql.user WHERE `Host` = 'localhost'")
+            users = [row['user'] for row in cursor.fetchall()]
+            cursor.execute("SELECT `Db` AS db FROM mysql.db WHERE `Host` = 'localhost' AND `Db` = `User`")
+            owned = set(row['db'] for row in cursor.fetchall())
+        connection.commit()
+
+        def created_by_deployer(name: str) -> bool:
+            return name not in self.SYSTEM_DATABASES and name != Config.MYSQL_USER and \
+                (self.LABEL_PATTERN.fullmatch(name) is not None or name in owned)
+
+        for name in databases:
+            if name not in labels and created_by_deployer(name):
+                self._remove(f"database {name}", self._execute, connection, f"DROP DATABASE IF EXISTS `{name}`")
+        for name in users:
+            if name not in labels and created_by_deployer(name):
+                self._remove(f"database user {name}", self._execute, connection, "DROP USER IF EXISTS %s@'localhost'",
+                             (name,))
+
+    def _remove_orphaned_sites(self, labels: Set[str]):
+        for name in self._list(Config.NGINX_SITES_AVAILABLE):
+            if name in labels or name.startswith('.'):
+                continue
+            content = NginxSites.read_site(name) or ''
+            if os.path.join(Config.WEB_FOLDER, name, '') in content or Lifecycle.access_log(name) in content:
+                self._remove(f"nginx site {name}", self.nginx.remove_site, name)
+        for name in self._list(Config.NGINX_SITES_ENABLED):
+            path = os.path.join(Config.NGINX_SITES_ENABLED, name)
+            # dangling links to removed deployer sites
+            if os.path.islink(path) and not os.path.exists(path) and \
+                    os.readlink(path) == os.path.join(Config.NGINX_SITES_AVAILABLE, name):
+                self._remove(f"nginx site link {name}", self.nginx.remove_site, name)
+
+    def _remove_orphaned_files(self, labels: Set[str]):
+        patterns = [
+            (Config.LABEL_LOG_FILE_DIRECTORY, re.compile(r'(?P<label>[A-Za-z0-9_-]+)\.txt(\.\d+\.gz)?')),
+            (Config.ACCESS_LOG_FOLDER, re.compile(r'(?P<label>[A-Za-z0-9_-]+)\.log(\.\d+)?(\.gz)?')),
+            (Config.SUSPEND_FOLDER, re.compile(r'(?P<label>[A-Za-z0-9_-]+)\.sql\.gz')),
+        ]
+        for folder, pattern in patterns:
+            for name in self._list(folder):
+                match = pattern.fullmatch(name)
+                if match is not None and match.group('label') not in labels:
+                    self._remove(f"file {name}", os.unlink, os.path.join(folder, name))
+
+    @staticmethod
+    def _remove(description: str, function, *args):
+        if not Config.GC_REMOVE_ORPHANS:
+            logger.warning(f"Orphaned {description} (not removed, GC_REMOVE_ORPHANS is disabled)")
+            return
+        logger.warning(f"Remove orphaned {description}")
+        try:
+            function(*args)
+        except Exception as e:
+            logger.error(f"Failed to remove orphaned {description}: {e}")
+
+    @staticmethod
+    def _execute(connection: pymysql.Connection, query: str, params: tuple = None):
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+        connection.commit()
+
+    @staticmethod
+    def _list(folder: str) -> List[str]:
+        try:
+            return sorted(os.listdir(folder))
+        except FileNotFoundError:
+            return []
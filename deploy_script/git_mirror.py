@@ -0,0 +1,133 @@
+import hashlib
+import os
+import subprocess
+import threading
+from typing import Callable, List, Set, Tuple
+
+from config import Config
+from file_lock import file_lock
+from logger import get_logger
+
+logger = get_logger()
+
+
+class GitMirror:
+    """
+    Persistent bare repository which stores the git objects of all deployments once.
+
+    Upstream branches are fetched incrementally once per run, forks are added as extra remotes.
+    Deployments are cloned with ``--shared`` and therefore only reference the objects of the mirror
+    (``.git/objects/info/alternates``). Objects are never pruned from the mirror, since checkouts may
+    still point to commits that were force-pushed away. Fetches into the mirror are serialized, also between
+    the worker processes of one machine (``LOCK_FILE``).
+
+    The mirror belongs to root, the checkouts belong to ``WORKTREE_USER``: git commands in a checkout run
+    as that user, so checked out files never need a recursive chown.
+    """
+    UPSTREAM_REMOTE = 'origin'
+    WORKTREE_USER = 'www-data'
+    LOCK_FILE = 'prdeployer.lock'
+
+    path: str
+    _run_subprocess: Callable
+    _lock: threading.Lock
+    _fetched: Set[Tuple[str, str]]
+
+    def __init__(self, run_subprocess: Callable, path: str = Config.GIT_MIRROR_FOLDER):
+        self.path = path
+        self._run_subprocess = run_subprocess
+        self._lock = threading.Lock()
+        self._fetched = set()
+
+    @staticmethod
+    def upstream_url() -> str:
+        return f'https://github.com/{Config.GITHUB_REPO_OWNER}/{Config.GITHUB_REPO_NAME}.git'
+
+    def remote_name(self, clone_url: str) -> str:
+        if self._normalize_url(clone_url) == self._normalize_url(self.upstream_url()):
+            return self.UPSTREAM_REMOTE
+        return 'fork-' + hashlib.sha1(self._normalize_url(clone_url).encode('utf-8')).hexdigest()[:12]
+
+    def start_run(self):
+        """Forget which refs were fetched, so that the next fetches go to the network again."""
+        with self._lock:
+            self._fetched.clear()
+
+    def fetch(self, clone_url: str, branch: str, label: str):
+        """Fetch the branch of the remote repository into the mirror, at most once per run."""
+        remote = self.remote_name(clone_url)
+        with file_lock(self._lock, self.path, self.LOCK_FILE):
+            self._ensure_mirror(label)
+            if remote == self.UPSTREAM_REMOTE:
+                key = (remote, '*')
+                refspec = f'+refs/heads/*:refs/remotes/{remote}/*'
+            else:
+                key = (remote, branch)
+                refspec = f'+refs/heads/{branch}:refs/remotes/{remote}/{branch}'
+            if key in self._fetched:
+                return
+            if not self._has_remote(remote):
+                logger.info(f"Add remote {remote} for {clone_url} to git mirror")
+                self._run_subprocess(["git", "remote", "add", "--no-tags", remote, clone_url], label,
+                                     "add remote to git mirror", self.path)
+            logger.info(f"Fetch {remote} ({key[1]}) into git mirror")
+            self._run_subprocess(["git", "fetch", "--prune", "--no-tags", remote, refspec], label,
+                                 "fetch into git mirror", self.path)
+            self._fetched.add(key)
+
+    def clone(self, git_folder: str, branch: str, sha: str, label: str):
+        """Create a checkout of the commit which shares all objects with the mirror."""
+        # git refuses to read a mirror owned by another user, therefore root clones. Without checkout and
+        # with shared objects the clone only consists of a few files in .git
+        self._run_subprocess(["git", "clone", "--shared", "--no-checkout", self.path, git_folder], label,
+                             "clone from git mirror", os.path.dirname(git_folder.rstrip('/')))
+        self._run_subprocess(["chown", "-R", f"{self.WORKTREE_USER}:{self.WORKTREE_USER}", git_folder], label,
+                             "set ownership of the clone", git_folder)
+        self.checkout(git_folder, branch, sha, label)
+
+    def checkout(self, git_folder: str, branch: str, sha: str, label: str):
+        """Reset an existing checkout to the commit, attaching it to the mirror if necessary."""
+        self._attach(git_folder)
+        self._run_subprocess(self.worktree_git(["cat-file", "-e", sha + '^{commit}']), label,
+                             f"find commit {sha} in git mirror", git_folder)
+        self._run_subprocess(self.worktree_git(["checkout", "--force", "-B", branch, sha]), label,
+                             "run git checkout", git_folder)
+
+    @classmethod
+    def worktree_git(cls, args: List[str]) -> List[str]:
+        """Command line of a git command in a checkout."""
+        return ["sudo", "-u", cls.WORKTREE_USER, "git"] + args
+
+    def _attach(self, git_folder: str):
+        # checkouts cloned before the mirror existed do not know its objects yet
+        alternates_file = os.path.join(git_folder, '.git', 'objects', 'info', 'alternates')
+        mirror_objects = os.path.join(os.path.realpath(self.path), 'objects')
+        alternates = []
+        if os.path.isfile(alternates_file):
+            with open(alternates_file, 'r') as f:
+                alternates = f.read().splitlines()
+        if mirror_objects not in alternates:
+            logger.debug(f"Attach {git_folder} to git mirror objects")
+            os.makedirs(os.path.dirname(alternates_file), exist_ok=True)
+            with open(alternates_file, 'a') as f:
+                print(mirror_objects, file=f)
+
+    def _ensure_mirror(self, label: str):
+        if os.path.isfile(os.path.join(self.path, 'HEAD')):
+            return
+        logger.info(f"Initialize git mirror in {self.path}")
+        os.makedirs(self.path, exist_ok=True)
+        self._run_subprocess(["git", "init", "--bare"], label, "initialize git mirror", self.path)
+        self._run_subprocess(["git", "config", "gc.auto", "0"], label, "configure git mirror", self.path)
+        self._run_subprocess(["git", "config", "gc.pruneExpire", "never"], label, "configure git mirror", self.path)
+
+    def _has_remote(self, remote: str) -> bool:
+        p = subprocess.run(["git", "remote"], cwd=self.path, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        return remote in p.stdout.decode('utf-8').split()
+
+    @staticmethod
+    def _normalize_url(url: str) -> str:
+        url = url.strip().rstrip('/').lower()
+        if url.endswith('.git'):
+            url = url[:-4]
+        return url
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+from logger import get_logger
+
+logger = get_logger()
+
+
+class GitHubApiException(Exception):
+    message = ""
+    status_code: int
+
+    def __init__(self, message: str, status_code: int) -> None:
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class GitHubClient:
+    """
+    Small GitHub REST API v3 client using one pooled session.
+
+    Responses are cached on disk together with their ETag/Last-Modified headers. Later requests
+    are sent conditionally, so unchanged resources are answered with 304 Not Modified, which does
+    not count against the rate limit. When the remaining rate limit runs low, the client waits
+    for the reset (at most ``Config.GITHUB_RATE_LIMIT_MAX_WAIT`` seconds).
+    """
+    session: requests.Session
+    request_count: int
+    _lock: threading.Lock
+
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(4, Config.MAX_PARALLEL_DEPLOYMENTS))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Accept': 'application/vnd.github.v3+json',
+                                     'User-Agent': 'Catroweb-AutoDeploy'})
+        if Config.GITHUB_TOKEN:
+            self.session.headers['Authorization'] = 'token ' + Config.GITHUB_TOKEN
+        self.request_count = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def repo_path(path: str = '') -> str:
+        return f'/repos/{Config.GITHUB_REPO_OWNER}/{Config.GITHUB_REPO_NAME}{path}'
+
+    def get_json(self, path: str, params: Dict[str, Any] = None) -> Any:
+        data, _ = self._get(self._url(path, params))
+        return data
+
+    def get_paginated(self, path: str, params: Dict[str, Any] = None) -> List[Any]:
+        """Fetch all pages of a list resource by following the rel="next" links."""
+        items = []
+        url = self._url(path, params)
+        while url is not None:
+            data, links = self._get(url)
+            items += data
+            url = links.get('next')
+        return items
+
+    def post_graphql(self, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a GraphQL query (the GraphQL API requires a token) and return its data."""
+        response = self.session.post(Config.GITHUB_GRAPHQL_URL, json={'query': query, 'variables': variables},
+                                     headers={'X-Github-Next-Global-ID': '0'},  # numeric ids in label node ids
+                                     timeout=Config.GITHUB_REQUEST_TIMEOUT)
+        with self._lock:
+            self.request_count += 1
+        self._respect_rate_limit(response)
+        if response.status_code != 200:
+            raise GitHubApiException(f"GitHub GraphQL request failed: Error {response.status_code}",
+                                     response.status_code)
+        result = json.loads(response.content.decode('utf-8'))
+        if result.get('errors'):
+            raise GitHubApiException("GitHub GraphQL request failed: " +
+                                     '; '.join(error.get('message', '') for error in result['errors']),
+                                     response.status_code)
+        return result['data']
+
+    def _get(self, url: str):
+        cached = self._load_cache(url)
+        headers = {}
+        if cached is not None:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        response = self.session.get(url, headers=headers, timeout=Config.GITHUB_REQUEST_TIMEOUT)
+        with self._lock:
+            self.request_count += 1
+        self._respect_rate_limit(response)
+
+        if response.status_code == 304 and cached is not None:
+            logger.debug(f"GitHub API {url}: not modified")
+            return json.loads(cached['body']), cached.get('links', {})
+        if response.status_code != 200:
+            raise GitHubApiException(f"GitHub API request {url} failed: Error {response.status_code}",
+                                     response.status_code)
+
+        body = response.content.decode('utf-8')
+        links = {rel: link['url'] for rel, link in response.links.items()}
+        self._store_cache(url, {'etag': response.headers.get('ETag'),
+                                'last_modified': response.headers.get('Last-Modified'),
+                                'links': links,
+                                'body': body})
+        return json.loads(body), links
+
+    def _respect_rate_limit(self, response: requests.Response):
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset = response.headers.get('X-RateLimit-Reset')
+        if remaining is None or reset is None or int(remaining) > Config.GITHUB_RATE_LIMIT_RESERVE:
+            return
+        wait = max(0, int(reset) - int(time.time())) + 1
+        if wait > Config.GITHUB_RATE_LIMIT_MAX_WAIT:
+            raise GitHubApiException(f"GitHub API rate limit almost exhausted ({remaining} requests left), "
+                                     f"reset in {wait} seconds", response.status_code)
+        logger.warning(f"GitHub API rate limit almost exhausted ({remaining} requests left), wait {wait} seconds")
+        time.sleep(wait)
+
+    @staticmethod
+    def _url(path: str, params: Optional[Dict[str, Any]]) -> str:
+        url = path if path.startswith('http') else Config.GITHUB_API_URL.rstrip('/') + path
+        return requests.Request('GET', url, params=params).prepare().url
+
+    @staticmethod
+    def _cache_path(url: str) -> str:
+        return os.path.join(Config.GITHUB_CACHE_FOLDER, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.json')
+
+    def _load_cache(self, url: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._cache_path(url), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store_cache(self, url: str, entry: Dict[str, Any]):
+        if not entry['etag'] and not entry['last_modified']:
+            return
+        try:
+            os.makedirs(Config.GITHUB_CACHE_FOLDER, exist_ok=True)
+            tmp_path = self._cache_path(url) + '.' + uuid.uuid4().hex
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._cache_path(url))
+        except OSError as e:
+            logger.warning(f"Failed to cache GitHub API response of {url}: {e}")
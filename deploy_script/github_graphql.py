@@ -0,0 +1,112 @@
+import base64
+import binascii
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import Config
+from github_client import GitHubClient
+from logger import get_logger
+
+logger = get_logger()
+
+PULL_REQUEST_FIELDS = '''
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        number
+        title
+        url
+        author { login }
+        headRefName
+        headRefOid
+        headRepository { url }
+        labels(first: 50) { nodes { id name } }
+      }'''
+
+BRANCH_FIELDS = '{ target { ... on Commit { oid message author { name } } } }'
+
+
+class GitHubGraphQLBackend:
+    """
+    Fetches all open pull requests and the tracked branches with one GraphQL query per 100 pull requests.
+
+    Only the fields used by the deployer are requested. The results are converted to the shape of the
+    REST API v3 responses, so they can be used by the code paths which build the ``DeploymentData``.
+    """
+    _client: GitHubClient
+
+    def __init__(self, client: GitHubClient):
+        self._client = client
+
+    def fetch(self, branches: List[str]) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """Returns the open pull requests and a map of branch name to branch, in REST API format."""
+        pull_requests = []
+        branch_results = {}
+        cursor = None
+        while True:
+            data = self._client.post_graphql(self._query(branches if cursor is None else []),
+                                             {'owner': Config.GITHUB_REPO_OWNER, 'name': Config.GITHUB_REPO_NAME,
+                                              'cursor': cursor})
+            repository = data['repository']
+            if cursor is None:
+                for index, branch in enumerate(branches):
+                    ref = repository.get(f'branch{index}')
+                    if ref is None:
+                        logger.error(f"Failed to get GitHub data for branch {branch}: not found")
+                        continue
+                    branch_results[branch] = self._convert_branch(branch, ref)
+            for node in repository['pullRequests']['nodes']:
+                pull_request = self._convert_pull_request(node)
+                if pull_request is not None:
+                    pull_requests.append(pull_request)
+            page_info = repository['pullRequests']['pageInfo']
+            if not page_info['hasNextPage']:
+                break
+            cursor = page_info['endCursor']
+        return pull_requests, branch_results
+
+    @staticmethod
+    def _query(branches: List[str]) -> str:
+        branch_queries = ''.join(f'\n    branch{index}: ref(qualifiedName: {json.dumps("refs/heads/" + branch)}) '
+                                 f'{BRANCH_FIELDS}' for index, branch in enumerate(branches))
+        return ('query($owner: String!, $name: String!, $cursor: String) {\n'
+                '  repository(owner: $owner, name: $name) {\n'
+                '    pullRequests(states: OPEN, first: 100, after: $cursor, '
+                'orderBy: {field: CREATED_AT, direction: DESC}) {' + PULL_REQUEST_FIELDS + '\n    }' +
+                branch_queries + '\n  }\n}')
+
+    @classmethod
+    def _convert_pull_request(cls, node: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if node['headRepository'] is None:
+            logger.warning(f"Skip pull request {node['number']}, its head repository was deleted")
+            return None
+        return {
+            'number': node['number'],
+            'title': node['title'],
+            'html_url': node['url'],
+            'user': {'login': node['author']['login'] if node['author'] else None},
+            'head': {'sha': node['headRefOid'], 'ref': node['headRefName'],
+                     'repo': {'clone_url': node['headRepository']['url'] + '.git'}},
+            'labels': [{'id': cls._label_id(label['id']), 'name': label['name']}
+                       for label in node['labels']['nodes']],
+        }
+
+    @staticmethod
+    def _convert_branch(branch: str, ref: Dict[str, Any]) -> Dict[str, Any]:
+        commit = ref['target']
+        return {
+            'commit': {'sha': commit['oid'],
+                       'commit': {'message': commit['message'], 'author': {'name': commit['author']['name']}}},
+            '_links': {'html': f'https://github.com/{Config.GITHUB_REPO_OWNER}/{Config.GITHUB_REPO_NAME}'
+                               f'/tree/{branch}'},
+        }
+
+    @staticmethod
+    def _label_id(node_id: str) -> Optional[int]:
+        # legacy global node ids are base64 encoded "<length>:Label<database id>"
+        try:
+            decoded = base64.b64decode(node_id).decode('utf-8')
+        except (binascii.Error, UnicodeDecodeError):
+            return None
+        matches = re.search(r'Label(\d+)$', decoded)
+        return int(matches.group(1)) if matches else None
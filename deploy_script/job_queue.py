@@ -0,0 +1,216 @@
+import ipaddress
+import json
+import os
+import shutil
+from typing import Any, Dict, List, Optional
+
+import pymysql
+
+from config import Config
+from logger import get_logger
+
+logger = get_logger()
+
+
+def is_local(row: Dict[str, Any]) -> bool:
+    """Whether the deployment of the row is on this host, rows without a host belong to the coordinator's host."""
+    return not Config.JOB_QUEUE or (row.get('host') or Config.HOST_NAME) == Config.HOST_NAME
+
+
+class QueuedJob:
+    id: int
+    label: str
+    priority: int
+    action: str
+    payload: Dict[str, Any]
+
+    def __init__(self, row: Dict[str, Any]):
+        self.id = int(row['id'])
+        self.label = row['label']
+        self.priority = int(row['priority'])
+        self.action = row['action']
+        self.payload = json.loads(row['payload'])
+
+    def __repr__(self):
+        return 'QueuedJob(' + repr(self.id) + ', ' + repr(self.label) + ', ' + repr(self.action) + ')'
+
+
+class JobQueue:
+    """
+    Jobs of the multi-host mode in the ``deployment_job`` table, hosts in ``deployment_host``.
+
+    The coordinator (``Deployer.run()`` with ``Config.JOB_QUEUE``) queues at most one job per label, a newer job
+    of the same or a higher priority replaces the queued one. Every label is placed on one host: the host of
+    its deployment, or for new labels the live host with the most free disk space among those below
+    ``Config.PLACEMENT_MAX_LOAD``. Workers claim the jobs of their host with ``FOR UPDATE SKIP LOCKED``,
+    never two jobs of the same label at the same time, and extend the lease of their running jobs with
+    heartbeats; the job of a worker without heartbeat for ``Config.JOB_LEASE_SECONDS`` is claimed again.
+    """
+    _placed: Dict[str, int]  # host -> labels placed on it by this coordinator run
+
+    def __init__(self):
+        self._placed = {}
+
+    @staticmethod
+    def enqueue(connection: pymysql.Connection, label: str, priority: int, action: str, payload: Dict[str, Any],
+                host: Optional[str]) -> bool:
+        """Queue a job, returns False if the same or a more important job of the label is queued or running."""
+        payload_json = json.dumps(payload, sort_keys=True)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT `id`, `priority`, `action`, `payload`, `state` FROM deployment.deployment_job "
+                               "WHERE `label` = %s AND (`state` = 'queued' OR `state` = 'running') FOR UPDATE",
+                               (label,))
+                jobs = cursor.fetchall()
+                if any(job['action'] == action and job['payload'] == payload_json for job in jobs):
+                    connection.commit()
+                    return False
+                queued = [job for job in jobs if job['state'] == 'queued']
+                if queued and queued[0]['priority'] < priority:
+                    connection.commit()
+                    return False
+                if queued:
+                    cursor.execute("UPDATE deployment.deployment_job SET `priority` = %s, `action` = %s, "
+                                   "`payload` = %s, `host` = %s, `created_at` = CURRENT_TIMESTAMP WHERE `id` = %s",
+                                   (priority, action, payload_json, host, queued[0]['id']))
+                else:
+                    cursor.execute("INSERT INTO deployment.deployment_job(`label`, `priority`, `action`, `payload`, "
+                                   "`host`) VALUES(%s, %s, %s, %s, %s)", (label, priority, action, payload_json, host))
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        logger.info(f"Queued {action} job of {label} for {host or 'any host'}")
+        return True
+
+    @staticmethod
+    def claim(connection: pymysql.Connection, host: str) -> Optional[QueuedJob]:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT * FROM deployment.deployment_job j WHERE (j.`state` = 'queued' "
+                    "OR (j.`state` = 'running' AND j.`lease_expires_at` < CURRENT_TIMESTAMP)) "
+                    "AND (j.`host` IS NULL OR j.`host` = %s) "
+                    "AND NOT EXISTS (SELECT 1 FROM deployment.deployment_job r WHERE r.`label` = j.`label` "
+                    "AND r.`id` <> j.`id` AND r.`state` = 'running' AND r.`lease_expires_at` >= CURRENT_TIMESTAMP) "
+                    "ORDER BY j.`priority`, j.`id` LIMIT 1 FOR UPDATE SKIP LOCKED", (host,))
+                row = cursor.fetchone()
+                if row is not None:
+                    cursor.execute("UPDATE deployment.deployment_job SET `state` = 'running', `leased_by` = %s, "
+                                   "`attempts` = `attempts` + 1, "
+                                   "`lease_expires_at` = CURRENT_TIMESTAMP + INTERVAL %s SECOND WHERE `id` = %s",
+                                   (host, int(Config.JOB_LEASE_SECONDS), row['id']))
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        return None if row is None else QueuedJob(row)
+
+    @staticmethod
+    def active_jobs(connection: pymysql.Connection) -> Dict[str, Optional[str]]:
+        """Host of every label with a queued or running job, a running job is on the host which claimed it."""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT `label`, COALESCE(`leased_by`, `host`) AS host FROM deployment.deployment_job "
+                           "WHERE `state` = 'queued' OR `state` = 'running' ORDER BY `state` = 'running'")
+            # a running job of the label wins over its queued one
+            hosts = {row['label']: row['host'] for row in cursor.fetchall()}
+        connection.commit()
+        return hosts
+
+    @staticmethod
+    def extend_leases(connection: pymysql.Connection, host: str, job_ids: List[int]):
+        if not job_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE deployment.deployment_job "
+                           "SET `lease_expires_at` = CURRENT_TIMESTAMP + INTERVAL %s SECOND "
+                           "WHERE `leased_by` = %s AND `state` = 'running' AND `id` IN (" +
+                           ', '.join(['%s'] * len(job_ids)) + ")",
+                           (int(Config.JOB_LEASE_SECONDS), host, *job_ids))
+        connection.commit()
+
+    @staticmethod
+    def complete(connection: pymysql.Connection, job: QueuedJob, host: str, error: Optional[str] = None):
+        with connection.cursor() as cursor:
+            # a job which lost its lease was handed to another worker, that one completes it
+            cursor.execute("UPDATE deployment.deployment_job SET `state` = %s, `finished_at` = CURRENT_TIMESTAMP, "
+                           "`error` = %s WHERE `id` = %s AND `leased_by` = %s AND `state` = 'running'",
+                           ('failed' if error else 'done', error, job.id, host))
+        connection.commit()
+
+    @staticmethod
+    def prune(connection: pymysql.Connection, days: int):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM deployment.deployment_job WHERE `state` IN ('done', 'failed') "
+                           "AND `finished_at` < CURRENT_TIMESTAMP - INTERVAL %s DAY", (int(days),))
+        connection.commit()
+
+    @staticmethod
+    def check_address(address: Optional[str]):
+        """
+        Raises if the address is not an IP address with an optional port: the front end proxies to the addresses
+        of the route map at request time and has no resolver for host names.
+        """
+        address = address or ''
+        try:
+            if address.startswith('['):
+                host, _, port = address[1:].partition(']')
+                if port and not port.startswith(':'):
+                    raise ValueError(address)
+                ipaddress.IPv6Address(host)
+                port = port[1:]
+            else:
+                host, _, port = address.partition(':')
+                ipaddress.IPv4Address(host)
+            if port:
+                int(port)
+        except ValueError:
+            raise Exception(f"HOST_ADDRESS (--address) must be the IP address of this host with an optional port, "
+                            f"e.g. 10.0.0.2:443 or [fd00::2]:443, not '{address}'")
+
+    @staticmethod
+    def register_host(connection: pymysql.Connection, host: str, address: str):
+        """Heartbeat of a worker, with its free disk space and load for the placement of new labels."""
+        free_bytes = shutil.disk_usage(Config.WEB_FOLDER).free
+        load_average = os.getloadavg()[0]
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO deployment.deployment_host(`host`, `address`, `free_bytes`, `load_average`, "
+                           "`cpu_count`) VALUES(%s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE `address` = %s, "
+                           "`free_bytes` = %s, `load_average` = %s, `cpu_count` = %s, "
+                           "`heartbeat_at` = CURRENT_TIMESTAMP",
+                           (host, address, free_bytes, load_average, os.cpu_count() or 1,
+                            address, free_bytes, load_average, os.cpu_count() or 1))
+        connection.commit()
+
+    @staticmethod
+    def live_hosts(connection: pymysql.Connection) -> List[Dict[str, Any]]:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT * FROM deployment.deployment_host "
+                           "WHERE `heartbeat_at` >= CURRENT_TIMESTAMP - INTERVAL %s SECOND",
+                           (int(Config.JOB_LEASE_SECONDS),))
+            hosts = cursor.fetchall()
+        connection.commit()
+        return hosts
+
+    def place(self, hosts: List[Dict[str, Any]]) -> Optional[str]:
+        """Host for a new label: the most free disk space (minus the labels placed in this run) below the load limit."""
+        if not hosts:
+            return None
+        idle = [host for host in hosts if host['load_average'] / max(1, host['cpu_count']) < Config.PLACEMENT_MAX_LOAD]
+        candidates = idle or hosts
+        best = max(candidates, key=lambda host: int(host['free_bytes']) -
+                   self._placed.get(host['host'], 0) * Config.PLACEMENT_RESERVED_BYTES)
+        self._placed[best['host']] = self._placed.get(best['host'], 0) + 1
+        return best['host']
+
+    @staticmethod
+    def routes(connection: pymysql.Connection) -> Dict[str, str]:
+        """Address of the host of every deployed or placed label, for the route map of the front end."""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT d.`label`, h.`address` FROM deployment.deployment d "
+                           "JOIN deployment.deployment_host h ON h.`host` = d.`host` "
+                           "UNION SELECT j.`label`, h.`address` FROM deployment.deployment_job j "
+                           "JOIN deployment.deployment_host h ON h.`host` = j.`host` WHERE j.`state` = 'queued'")
+            routes = {row['label']: row['address'] for row in cursor.fetchall()}
+        connection.commit()
+        return routes
@@ -0,0 +1,127 @@
+import os
+import shutil
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from config import Config
+from db_snapshot import dump_database, load_database
+from logger import get_logger
+
+logger = get_logger()
+
+
+class Lifecycle:
+    """
+    Suspends idle deployments and brings them back on request.
+
+    The last access of a deployment is the modification time of its own nginx access log
+    (``Config.ACCESS_LOG_FOLDER``), an empty log (e.g. right after logrotate) tells nothing.
+    Suspending dumps and drops the database and removes the folders which the build stages can
+    recreate (``Config.SUSPEND_REMOVE_FOLDERS``). Wake requests are empty files named after the
+    label in ``Config.WAKE_REQUEST_FOLDER``, created by wake.php of the index page.
+    """
+    _run_subprocess: Callable
+
+    def __init__(self, run_subprocess: Callable):
+        self._run_subprocess = run_subprocess
+
+    @staticmethod
+    def access_log(label: str) -> str:
+        return os.path.join(Config.ACCESS_LOG_FOLDER, label + '.log')
+
+    @staticmethod
+    def last_access(label: str) -> Optional[datetime]:
+        try:
+            stat = os.stat(Lifecycle.access_log(label))
+        except FileNotFoundError:
+            return None
+        if stat.st_size == 0:
+            return None
+        return datetime.fromtimestamp(int(stat.st_mtime))
+
+    @staticmethod
+    def idle_labels(rows: List[Dict[str, Any]], now: datetime) -> List[str]:
+        """Labels of the deployed rows which were neither accessed nor deployed within the idle time."""
+        if not Config.SUSPEND_IDLE_DAYS:
+            return []
+        idle = []
+        for row in rows:
+            if row['type'] not in Config.SUSPEND_TYPES or row.get('suspended_at') or row['fail_count'] != 0:
+                continue
+            active_at = max([t for t in (row.get('deployed_at'), row.get('last_access_at')) if t is not None],
+                            default=None)
+            if active_at is not None and now - active_at > timedelta(days=Config.SUSPEND_IDLE_DAYS):
+                idle.append(row['label'])
+        return idle
+
+    @staticmethod
+    def wake_requests() -> List[str]:
+        try:
+            return sorted(name for name in os.listdir(Config.WAKE_REQUEST_FOLDER) if not name.startswith('.'))
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def clear_wake_request(label: str):
+        try:
+            os.unlink(os.path.join(Config.WAKE_REQUEST_FOLDER, label))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def dump_path(label: str) -> str:
+        return os.path.join(Config.SUSPEND_FOLDER, label + '.sql.gz')
+
+    def dump(self, label: str):
+        """Write the dump of the database of the label, it is only replaced once complete."""
+        os.makedirs(Config.SUSPEND_FOLDER, exist_ok=True)
+        tmp_path = self.dump_path(label) + '.tmp'
+        dump_database(self._run_subprocess, label, tmp_path, label)
+        os.replace(tmp_path, self.dump_path(label))
+
+    def remove_build_outputs(self, label: str, git_folder: str) -> int:
+        """Remove the folders which the build stages recreate, returns the number of freed bytes."""
+        freed = 0
+        for folder in Config.SUSPEND_REMOVE_FOLDERS:
+            path = os.path.join(git_folder, folder)
+            freed += self.unshared_size(path)
+            logger.info(f"Remove {folder}/ of {label}")
+            shutil.rmtree(path, ignore_errors=True)
+        return freed
+
+    def resume(self, label: str):
+        """Load the database dump of the suspended label."""
+        load_database(self._run_subprocess, label, self.dump_path(label), label)
+
+    def finish_resume(self, label: str):
+        for path in (self.dump_path(label), os.path.join(Config.WAKE_REQUEST_FOLDER, label)):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def forget(self, label: str):
+        """Remove the dump, wake request and access log of a deleted deployment."""
+        self.finish_resume(label)
+        try:
+            os.unlink(self.access_log(label))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def unshared_size(path: str) -> int:
+        """
+        Bytes freed by removing the path: the allocated size of the files whose hardlinks are all below it,
+        files also linked from a cache or another release do not count.
+        """
+        inodes = {}  # (device, inode) -> links below the path, all links, allocated bytes
+        for root, dirs, files in os.walk(path):
+            for name in files:
+                try:
+                    stat = os.lstat(os.path.join(root, name))
+                except OSError:
+                    continue
+                key = (stat.st_dev, stat.st_ino)
+                links = inodes[key][0] + 1 if key in inodes else 1
+                inodes[key] = (links, stat.st_nlink, stat.st_blocks * 512)
+        return sum(size for links, nlink, size in inodes.values() if links == nlink)
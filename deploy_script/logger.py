@@ -1,6 +1,14 @@
 # Source: https://stackoverflow.com/questions/384076/how-can-i-color-python-logging-output
+import atexit
+import glob
+import gzip
 import logging
 import logging.handlers
+import os
+import queue
+import shutil
+import sys
+from typing import BinaryIO, Dict, List, Optional
 
 from config import Config
 
@@ -27,13 +35,152 @@ class ColoredFormatter(logging.Formatter):
         self.use_color = use_color
 
     def format(self, record):
-        import copy
-        record = copy.copy(record)
         levelname = record.levelname
-        if self.use_color and levelname in COLORS:
-            levelname_color = COLOR_SEQ % (30 + COLORS[levelname]) + levelname + RESET_SEQ
-            record.levelname = levelname_color
-        return logging.Formatter.format(self, record)
+        if not self.use_color or levelname not in COLORS:
+            return logging.Formatter.format(self, record)
+        # records are only formatted by the listener thread, changing them in place saves a copy per line
+        record.levelname = COLOR_SEQ % (30 + COLORS[levelname]) + levelname + RESET_SEQ
+        try:
+            return logging.Formatter.format(self, record)
+        finally:
+            record.levelname = levelname
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread, which does the formatting and all the I/O."""
+
+    def prepare(self, record):
+        # the record is not used by other handlers, unlike QueueHandler.prepare() it is not copied
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class LogListener(logging.handlers.QueueListener):
+    def handle(self, record):
+        super().handle(record)
+        # write in batches while the deploy threads log faster than the files are written
+        if self.queue.empty():
+            for handler in self.handlers:
+                handler.flush()
+
+
+class LabelLogFile:
+    """
+    Log file of a label in segments: ``{label}.txt`` is the current one, full segments are compressed to
+    ``{label}.txt.{n}.gz`` and only the last ``Config.LABEL_LOG_MAX_SEGMENTS`` of them are kept.
+    """
+    path: str
+    _file: BinaryIO
+    _size: int
+    _segment: int
+
+    def __init__(self, path: str):
+        self.path = path
+        self._segment = 0
+        for segment in glob.glob(glob.escape(path) + '.*.gz'):
+            os.unlink(segment)
+        self._open()
+
+    def write(self, data: bytes):
+        if self._size > 0 and self._size + len(data) > Config.LABEL_LOG_SEGMENT_BYTES:
+            self._rotate()
+        self._file.write(data)
+        self._size += len(data)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def _open(self):
+        # a new file (not truncated), so that readers following it by offset notice the change of its inode
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._file = open(self.path, 'wb')
+        self._size = 0
+
+    def _rotate(self):
+        self._file.close()
+        self._segment += 1
+        with open(self.path, 'rb') as src, gzip.open(f'{self.path}.{self._segment}.gz', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        expired = f'{self.path}.{self._segment - Config.LABEL_LOG_MAX_SEGMENTS}.gz'
+        if os.path.exists(expired):
+            os.unlink(expired)
+        self._open()
+
+
+class LabelLogHandler(logging.Handler):
+    """
+    Writes the records of a thread into the log files of the labels it deploys.
+
+    Threads start and stop their label logs with control records through the same queue as their
+    log records, so that the listener sees both in order.
+    """
+    _labels: Dict[int, List[str]]  # thread id -> labels
+    _files: Dict[str, LabelLogFile]
+
+    def __init__(self):
+        logging.Handler.__init__(self, logging.NOTSET)
+        self.setFormatter(logging.Formatter(ColoredLogger.FILE_FORMAT))
+        self._labels = {}
+        self._files = {}
+
+    def emit(self, record):
+        command = getattr(record, 'label_log', None)
+        if command is not None:
+            self._control(record.thread, *command)
+            return
+        labels = self._labels.get(record.thread)
+        # records of other libraries using this logger class (e.g. urllib3) stay out of the label logs
+        if not labels or record.name != 'prdeployer':
+            return
+        try:
+            data = (self.format(record) + '\n').encode('utf-8', errors='replace')
+            for label in labels:
+                self._files[label].write(data)
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        for file in self._files.values():
+            file.flush()
+
+    def _control(self, thread: int, action: str, label: Optional[str]):
+        try:
+            if action == 'start':
+                self._close(label)
+                self._files[label] = LabelLogFile(os.path.join(Config.LABEL_LOG_FILE_DIRECTORY, label + '.txt'))
+                self._labels.setdefault(thread, []).append(label)
+            elif action == 'stop':
+                for label in self._labels.pop(thread, []):
+                    self._close(label)
+            elif action == 'remove':
+                self._close(label)
+                path = os.path.join(Config.LABEL_LOG_FILE_DIRECTORY, label + '.txt')
+                for name in [path] + glob.glob(glob.escape(path) + '.*.gz'):
+                    if os.path.exists(name):
+                        os.unlink(name)
+        except OSError as e:
+            sys.stderr.write(f"Failed to {action} the log of {label}: {e}\n")
+
+    def _close(self, label: str):
+        file = self._files.pop(label, None)
+        if file is not None:
+            file.close()
+        for labels in self._labels.values():
+            if label in labels:
+                labels.remove(label)
+
+
+_queue = queue.SimpleQueue()
+_console_handler: Optional[logging.Handler] = None
+_listener: Optional[LogListener] = None
 
 
 class ColoredLogger(logging.Logger):
@@ -42,20 +189,29 @@ class ColoredLogger(logging.Logger):
 
     def __init__(self, name):
         logging.Logger.__init__(self, name, logging.DEBUG)
+        self.addHandler(DeferredQueueHandler(_queue))
+        self._start_listener()
 
-        color_formatter = ColoredFormatter(self.formatter_message(self.CONSOLE_FORMAT, True))
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.DEBUG)
-        console_handler.setFormatter(color_formatter)
-        self.addHandler(console_handler)
+    @classmethod
+    def _start_listener(cls):
+        global _console_handler, _listener
+        if _listener is not None:
+            return
+        color_formatter = ColoredFormatter(cls.formatter_message(cls.CONSOLE_FORMAT, True))
+        _console_handler = logging.StreamHandler()
+        _console_handler.setLevel(logging.DEBUG)
+        _console_handler.setFormatter(color_formatter)
 
-        file_formatter = logging.Formatter(self.FILE_FORMAT)
+        file_formatter = logging.Formatter(cls.FILE_FORMAT)
         file_handler = logging.handlers.RotatingFileHandler(Config.LOG_FILE, maxBytes=512000, backupCount=3)
         file_handler.setLevel(logging.WARNING)
         file_handler.setFormatter(file_formatter)
-        self.addHandler(file_handler)
 
-        return
+        _listener = LogListener(_queue, _console_handler, file_handler, LabelLogHandler(),
+                                respect_handler_level=True)
+        _listener.start()
+        # the listener thread is a daemon, the records still in the queue are written before the exit
+        atexit.register(_listener.stop)
 
     @staticmethod
     def formatter_message(message, use_color=True):
@@ -65,10 +221,32 @@ class ColoredLogger(logging.Logger):
             message = message.replace("$RESET", "").replace("$BOLD", "")
         return message
 
-    @staticmethod
-    def create_file_handler(path: str):
-        file_formatter = logging.Formatter(ColoredLogger.FILE_FORMAT)
-        file_handler = logging.FileHandler(filename=path, mode='w')
-        file_handler.setLevel(logging.DEBUG)
-        file_handler.setFormatter(file_formatter)
-        return file_handler
+
+def _send_label_log_command(action: str, label: Optional[str]):
+    record = logging.LogRecord('prdeployer', logging.NOTSET, __file__, 0, '', None, None)
+    record.label_log = (action, label)
+    _queue.put(record)
+
+
+def start_label_log(label: str):
+    """Write the following records of the current thread into the log file of the label, a new file."""
+    _send_label_log_command('start', label)
+
+
+def stop_label_logs():
+    """Stop writing the records of the current thread into log files of labels."""
+    _send_label_log_command('stop', None)
+
+
+def remove_label_log(label: str):
+    _send_label_log_command('remove', label)
+
+
+def set_console_level(level: int):
+    _console_handler.setLevel(level)
+
+
+def get_logger() -> logging.Logger:
+    """Returns the logger shared by all modules of the deployer."""
+    logging.setLoggerClass(ColoredLogger)
+    return logging.getLogger('prdeployer')
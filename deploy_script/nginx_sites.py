@@ -0,0 +1,141 @@
+import os
+import subprocess
+import threading
+import uuid
+from typing import Dict, Optional
+
+from config import Config
+from logger import get_logger
+
+logger = get_logger()
+
+
+class NginxSites:
+    """
+    Manages the nginx site files of the deployments.
+
+    Site files are only written if their content changed. New content is validated with ``nginx -t``
+    before it is moved into place atomically. nginx is only reloaded if a site changed, and reloads
+    requested by many label changes can be coalesced into one debounced reload.
+    """
+    _changed: bool
+    _lock: threading.Lock
+    _reload_timer: Optional[threading.Timer]
+
+    def __init__(self):
+        self._changed = False
+        self._lock = threading.Lock()
+        self._reload_timer = None
+
+    def write_site(self, label: str, content: str) -> bool:
+        """Write the site file of the label and enable it, returns whether anything changed."""
+        available_path = os.path.join(Config.NGINX_SITES_AVAILABLE, label)
+        enabled_path = os.path.join(Config.NGINX_SITES_ENABLED, label)
+        changed = False
+
+        if self._read(available_path) != content:
+            logger.debug(f"Validate and write nginx site file for {label}")
+            tmp_path = os.path.join(Config.NGINX_SITES_AVAILABLE, f'.{label}.{uuid.uuid4().hex}.tmp')
+            try:
+                with open(tmp_path, 'w') as f:
+                    f.write(content)
+                self._validate(tmp_path, label)
+                os.replace(tmp_path, available_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+            changed = True
+        else:
+            logger.debug(f"nginx site file for {label} did not change")
+
+        if not os.path.lexists(enabled_path):
+            logger.debug(f"Create nginx site-enabled symlink for {label}")
+            os.symlink(available_path, enabled_path)
+            changed = True
+
+        if changed:
+            self._mark_changed()
+        return changed
+
+    def remove_site(self, label: str) -> bool:
+        changed = False
+        for path in (os.path.join(Config.NGINX_SITES_ENABLED, label),
+                     os.path.join(Config.NGINX_SITES_AVAILABLE, label)):
+            try:
+                os.unlink(path)
+                changed = True
+            except FileNotFoundError:
+                pass
+        if changed:
+            self._mark_changed()
+        return changed
+
+    def write_route_map(self, routes: Dict[str, str]) -> bool:
+        """Write the map from labels to the addresses of their hosts for the front end (multi-host mode)."""
+        content = ''.join(f'{label} {address};\n' for label, address in sorted(routes.items()))
+        if self._read(Config.NGINX_ROUTE_MAP) == content:
+            return False
+        tmp_path = Config.NGINX_ROUTE_MAP + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, Config.NGINX_ROUTE_MAP)
+        logger.info(f"Routes of {len(routes)} label(s) changed")
+        self._mark_changed()
+        return True
+
+    @classmethod
+    def read_site(cls, label: str) -> Optional[str]:
+        return cls._read(os.path.join(Config.NGINX_SITES_AVAILABLE, label))
+
+    def reload_if_changed(self):
+        with self._lock:
+            if not self._changed:
+                logger.info("No nginx site changed, skip reload")
+                return
+            self._changed = False
+        logger.info("Reload nginx")
+        p = subprocess.Popen(['systemctl', 'reload', 'nginx'])
+        if p.wait() != 0:
+            logger.error("Failed to reload nginx")
+
+    def request_reload(self, delay: float = None):
+        """Reload nginx after the delay, unless another reload is requested before."""
+        with self._lock:
+            if self._reload_timer is not None:
+                self._reload_timer.cancel()
+            self._reload_timer = threading.Timer(Config.NGINX_RELOAD_DEBOUNCE if delay is None else delay,
+                                                 self.reload_if_changed)
+            self._reload_timer.daemon = True
+            self._reload_timer.start()
+
+    def _mark_changed(self):
+        with self._lock:
+            self._changed = True
+
+    @staticmethod
+    def _validate(site_path: str, label: str):
+        if not Config.NGINX_VALIDATE_SITES:
+            return
+        # relative includes of the site are resolved relative to the main configuration file,
+        # therefore the test configuration is placed next to it
+        test_config = os.path.join(Config.NGINX_CONFIG_FOLDER, f'.prdeployer-test-{uuid.uuid4().hex}.conf')
+        try:
+            with open(test_config, 'w') as f:
+                print(f"pid {test_config}.pid;", file=f)
+                print("error_log stderr;", file=f)
+                print("events {}", file=f)
+                print(f"http {{ include {site_path}; }}", file=f)
+            p = subprocess.run(['nginx', '-t', '-q', '-c', test_config], stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT)
+            if p.returncode != 0:
+                raise Exception(f"Invalid nginx site file for {label}: {p.stdout.decode('utf-8').strip()}")
+        finally:
+            os.unlink(test_config)
+
+    @staticmethod
+    def _read(path: str) -> Optional[str]:
+        try:
+            with open(path, 'r') as f:
+                return f.read()
+        except OSError:
+            return None
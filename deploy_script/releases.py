@@ -0,0 +1,170 @@
+import os
+import shutil
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from config import Config
+from logger import get_logger
+
+logger = get_logger()
+
+
+class Releases:
+    """
+    Release directories of the deployments, so that an update never modifies the served files.
+
+    Every deployment is built in a new directory ``Config.RELEASES_FOLDER/<label>/<timestamp>-<sha>``, the stable
+    path ``Config.WEB_FOLDER/<label>`` (used by nginx) is a symlink to the active release and is replaced
+    atomically once the new release is complete. The outputs of unchanged build stages
+    (``Config.RELEASE_STAGE_OUTPUTS``) are hardlinked from the active release, therefore the files of a release
+    must never be modified in place (like the entries of ``ContentCache``). ``Config.RELEASES_FOLDER`` has to be
+    on the file system of ``Config.WEB_FOLDER``.
+
+    A deployment created before the releases is a directory at the stable path, its first update moves it to
+    the releases as the oldest one.
+    """
+    LEGACY_RELEASE = '00000000000000-legacy'
+    # composer install updates a copy of vendor/ incrementally, the other stages recreate their outputs
+    INCREMENTAL_STAGES = ['composer']
+
+    _run_subprocess: Callable
+
+    def __init__(self, run_subprocess: Callable):
+        self._run_subprocess = run_subprocess
+
+    @staticmethod
+    def link(label: str) -> str:
+        return os.path.join(Config.WEB_FOLDER, label)
+
+    @staticmethod
+    def folder(label: str) -> str:
+        return os.path.join(Config.RELEASES_FOLDER, label)
+
+    @staticmethod
+    def manifest_path(release: str) -> str:
+        """Copy of the build manifest of the release, restored by a rollback."""
+        return release + '.json'
+
+    @classmethod
+    def active(cls, label: str) -> Optional[str]:
+        """Directory of the served release, None if the deployment has none."""
+        link = cls.link(label)
+        if os.path.islink(link):
+            return os.readlink(link)
+        return link if os.path.isdir(link) else None
+
+    @classmethod
+    def all(cls, label: str) -> List[str]:
+        """Release directories of the deployment, oldest first."""
+        try:
+            names = os.listdir(cls.folder(label))
+        except FileNotFoundError:
+            return []
+        paths = [os.path.join(cls.folder(label), name) for name in sorted(names)]
+        return [path for path in paths if os.path.isdir(path) and not os.path.islink(path)]
+
+    @classmethod
+    def previous(cls, label: str) -> Optional[str]:
+        """The newest release older than the active one."""
+        active = cls.active(label)
+        if active is None or os.path.dirname(active) != cls.folder(label):
+            return None
+        older = [release for release in cls.all(label) if release < active]
+        return older[-1] if older else None
+
+    @classmethod
+    def new(cls, label: str, source_sha: str) -> str:
+        """Path of a new release of the commit, the caller clones into it."""
+        os.makedirs(cls.folder(label), exist_ok=True)
+        release = os.path.join(cls.folder(label), f'{datetime.now():%Y%m%d%H%M%S}-{source_sha[:8]}')
+        cls.discard(release)  # left behind by an attempt within the same second
+        return release
+
+    def carry_over(self, label: str, release: str, changed_stages: List[str]):
+        """Take the untracked files and the outputs of the unchanged stages from the active release."""
+        active = self.active(label)
+        if active is None:
+            return
+        for name in Config.RELEASE_COPY_FILES:
+            if os.path.isfile(os.path.join(active, name)):
+                shutil.copy2(os.path.join(active, name), os.path.join(release, name))
+        for stage, paths in Config.RELEASE_STAGE_OUTPUTS.items():
+            if stage in changed_stages and stage not in self.INCREMENTAL_STAGES:
+                continue
+            for path in paths:
+                source = os.path.join(active, path)
+                target = os.path.join(release, path)
+                if not os.path.lexists(source) or os.path.lexists(target):
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                if stage in changed_stages:
+                    self._run_subprocess(['cp', '-a', '--reflink=auto', source, target], label,
+                                         f"copy {path} of the active release", release)
+                else:
+                    self._run_subprocess(['cp', '-al', source, target], label, f"link {path} of the active release",
+                                         release)
+
+    def resync(self, label: str, release: str, changed_stages: List[str]):
+        """
+        Link the carried over outputs which the live application writes (``Config.RELEASE_RESYNC_PATHS``, e.g.
+        uploads) again, right before the switch, so that the writes since the start of the build are kept.
+        """
+        active = self.active(label)
+        if active is None:
+            return
+        for path in Config.RELEASE_RESYNC_PATHS:
+            source = os.path.join(active, path)
+            target = os.path.join(release, path)
+            stages = [stage for stage, paths in Config.RELEASE_STAGE_OUTPUTS.items() if path in paths]
+            if any(stage in changed_stages for stage in stages) or not os.path.isdir(source):
+                continue  # recreated by its stage
+            tmp_target = target + '.resync'
+            shutil.rmtree(tmp_target, ignore_errors=True)
+            self._run_subprocess(['cp', '-al', source, tmp_target], label, f"link {path} of the active release again",
+                                 release)
+            shutil.rmtree(target, ignore_errors=True)
+            os.rename(tmp_target, target)
+
+    def activate(self, label: str, release: str):
+        """Atomically point the stable path of the deployment at the release."""
+        link = self.link(label)
+        if os.path.isdir(link) and not os.path.islink(link):
+            legacy = os.path.join(self.folder(label), self.LEGACY_RELEASE)
+            logger.info(f"Move the web folder of {label} to {legacy}")
+            os.makedirs(self.folder(label), exist_ok=True)
+            os.rename(link, legacy)
+        tmp_link = link + '.tmp'
+        if os.path.lexists(tmp_link):
+            os.unlink(tmp_link)
+        os.symlink(release, tmp_link)
+        os.replace(tmp_link, link)
+        logger.info(f"Activated release {os.path.basename(release)} of {label}")
+
+    @classmethod
+    def prune(cls, label: str):
+        """Remove the releases beyond ``Config.RELEASE_RETENTION``, never the active one."""
+        releases = cls.all(label)
+        keep = set(releases[-max(1, Config.RELEASE_RETENTION):])
+        keep.add(cls.active(label))
+        for release in releases:
+            if release not in keep:
+                logger.info(f"Remove release {os.path.basename(release)} of {label}")
+                cls.discard(release)
+
+    @classmethod
+    def discard(cls, release: str):
+        shutil.rmtree(release, ignore_errors=True)
+        try:
+            os.unlink(cls.manifest_path(release))
+        except FileNotFoundError:
+            pass
+
+    @classmethod
+    def remove(cls, label: str):
+        """Remove the stable path and all releases of a deleted deployment."""
+        link = cls.link(label)
+        if os.path.islink(link):
+            os.unlink(link)
+        else:
+            shutil.rmtree(link, ignore_errors=True)
+        shutil.rmtree(cls.folder(label), ignore_errors=True)
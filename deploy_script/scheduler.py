@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from logger import get_logger
+
+logger = get_logger()
+
+
+class Job:
+    priority: int
+    label: str
+    function: Callable
+    args: tuple
+
+    def __init__(self, priority: int, label: str, function: Callable, *args):
+        self.priority = priority
+        self.label = label
+        self.function = function
+        self.args = args
+
+    def __repr__(self):
+        return 'Job(' + repr(self.priority) + ', ' + repr(self.label) + ', ' + self.function.__name__ + ')'
+
+
+class Scheduler:
+    """
+    Orders the deployment jobs of a run by priority, with at most one job per label.
+
+    No job is started after the time budget of the run is used up, running jobs are not interrupted. The next
+    run schedules the left over work again, the labels saved in ``deferred_file`` go first within their priority,
+    so that a run which always uses up its budget does not starve the same labels again and again.
+    """
+    BRANCH = 0  # tracked branches, e.g. develop and master
+    WAKE = 1  # somebody waits for a suspended deployment
+    PUSH = 2  # new pull requests and new commits
+    RETRY = 3  # failed deployments of the same commit, after their backoff
+    SUSPEND = 4
+    DELETE = 5
+
+    budget: Optional[float]
+    deferred_file: Optional[str]
+    _started_at: float
+    _jobs: Dict[str, Job]
+    _order: Dict[str, int]
+    _previously_deferred: Set[str]
+    _deferred: List[str]
+    _lock: threading.Lock
+
+    def __init__(self, budget: Optional[float] = None, deferred_file: Optional[str] = None):
+        self.budget = budget
+        self.deferred_file = deferred_file
+        self._started_at = time.monotonic()
+        self._jobs = {}
+        self._order = {}
+        self._previously_deferred = set(self._load_deferred())
+        self._deferred = []
+        self._lock = threading.Lock()
+
+    def add(self, priority: int, label: str, function: Callable, *args):
+        """Schedule a job, unless a job of the label with the same or a higher priority is scheduled already."""
+        current = self._jobs.get(label)
+        if current is not None and current.priority <= priority:
+            logger.debug(f"Skip {function.__name__} of {label}, {current.function.__name__} is scheduled already")
+            return
+        self._jobs[label] = Job(priority, label, function, *args)
+        self._order.setdefault(label, len(self._order))
+
+    def jobs(self) -> List[Job]:
+        return sorted(self._jobs.values(), key=lambda job: (job.priority, job.label not in self._previously_deferred,
+                                                            self._order[job.label]))
+
+    def start(self, job: Job) -> bool:
+        """Called before a job runs, returns False (and defers the job) if the time budget is used up."""
+        if self.budget is None or time.monotonic() - self._started_at < self.budget:
+            return True
+        with self._lock:
+            self._deferred.append(job.label)
+        return False
+
+    def finish(self):
+        """Save the deferred labels for the next run."""
+        if self._deferred:
+            logger.warning(f"Time budget of {self.budget:.0f}s used up, deferred to the next run: "
+                           f"{', '.join(self._deferred)}")
+        if not self.deferred_file:
+            return
+        tmp_path = self.deferred_file + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.deferred_file), exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(self._deferred, f)
+            os.replace(tmp_path, self.deferred_file)
+        except OSError as e:
+            logger.warning(f"Failed to save deferred labels: {e}")
+
+    def _load_deferred(self) -> List[str]:
+        if not self.deferred_file:
+            return []
+        try:
+            with open(self.deferred_file, 'r') as f:
+                return list(json.load(f))
+        except (OSError, ValueError, TypeError):
+            return []
@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+import uuid
+from typing import List, Optional
+
+from config import Config
+from logger import get_logger
+
+logger = get_logger()
+
+
+class StageCgroup:
+    """
+    Transient cgroup (v2) of a single command, below ``Config.STAGE_CGROUP_ROOT``.
+
+    The command limits itself: a shell writes its pid to ``cgroup.procs`` and then execs the command, so every
+    child it starts is limited as well. ``memory.max`` and ``cpu.weight`` come from ``Config.STAGE_LIMITS``,
+    swap is disabled, so a runaway build is killed by the OOM killer inside its cgroup instead of pushing
+    the host into swap. The root cgroup caps all commands together (``Config.STAGE_CGROUP_MEMORY_MAX``)
+    and its ``cpu.weight`` ranks them below the PHP-FPM pools of the live deployments.
+    ``memory.peak`` (Linux 5.19+) is the peak memory of the whole command including its children.
+    """
+    REMOVE_WAIT_SECONDS = 5
+
+    _root_lock = threading.Lock()
+    _root_ready: Optional[bool] = None
+
+    path: str
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @classmethod
+    def create(cls, label: str, stage: Optional[str]) -> Optional['StageCgroup']:
+        """The cgroup for a command of the stage, None if cgroups are disabled or not available."""
+        if not Config.STAGE_CGROUP_ROOT or not cls._setup_root():
+            return None
+        limits = Config.STAGE_LIMITS.get(stage) or Config.STAGE_LIMITS.get('default') or {}
+        path = os.path.join(Config.STAGE_CGROUP_ROOT, f'{label}.{uuid.uuid4().hex[:8]}')
+        try:
+            os.mkdir(path)
+            cgroup = cls(path)
+            if limits.get('memory_max'):
+                cgroup._write('memory.max', str(int(limits['memory_max'])))
+                cgroup._write_optional('memory.swap.max', '0')  # missing without swap accounting
+            if limits.get('cpu_weight'):
+                cgroup._write('cpu.weight', str(int(limits['cpu_weight'])))
+        except OSError as e:
+            logger.warning(f"Failed to create the cgroup of {label} ({stage}), run it without limits: {e}")
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass
+            return None
+        return cgroup
+
+    def wrap(self, command: List[str]) -> List[str]:
+        return ['sh', '-c', 'echo $$ > "$0" && exec "$@"', os.path.join(self.path, 'cgroup.procs')] + command
+
+    def peak_kb(self) -> Optional[int]:
+        value = self._read('memory.peak')
+        return None if value is None else int(value) // 1024
+
+    def oom_kills(self) -> int:
+        for line in (self._read('memory.events') or '').splitlines():
+            key, _, value = line.partition(' ')
+            if key == 'oom_kill':
+                return int(value)
+        return 0
+
+    def remove(self):
+        """Kill the processes left behind by the command and remove the cgroup."""
+        deadline = time.monotonic() + self.REMOVE_WAIT_SECONDS
+        while 'populated 1' in (self._read('cgroup.events') or ''):
+            if time.monotonic() > deadline:
+                logger.warning(f"Processes of cgroup {self.path} do not exit, leave it behind")
+                return
+            self._write_optional('cgroup.kill', '1')  # Linux 5.14+, older kernels wait for the processes to exit
+            time.sleep(0.1)
+        try:
+            os.rmdir(self.path)
+        except OSError as e:
+            logger.warning(f"Failed to remove cgroup {self.path}: {e}")
+
+    @classmethod
+    def _setup_root(cls) -> bool:
+        with cls._root_lock:
+            if cls._root_ready is None:
+                root = StageCgroup(Config.STAGE_CGROUP_ROOT)
+                try:
+                    os.makedirs(root.path, exist_ok=True)
+                    root._write('cgroup.subtree_control', '+memory +cpu')
+                    if Config.STAGE_CGROUP_MEMORY_MAX:
+                        root._write('memory.max', str(int(Config.STAGE_CGROUP_MEMORY_MAX)))
+                    root._write('cpu.weight', str(int(Config.STAGE_CGROUP_CPU_WEIGHT)))
+                    cls._root_ready = True
+                except OSError as e:
+                    logger.warning(f"cgroup v2 {root.path} is not available, commands run without limits: {e}")
+                    cls._root_ready = False
+            return cls._root_ready
+
+    def _write(self, name: str, value: str):
+        with open(os.path.join(self.path, name), 'w') as f:
+            f.write(value)
+
+    def _write_optional(self, name: str, value: str):
+        try:
+            self._write(name, value)
+        except OSError:
+            pass
+
+    def _read(self, name: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.path, name), 'r') as f:
+                return f.read().strip()
+        except OSError:
+            return None
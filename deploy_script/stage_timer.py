@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import Config
+from logger import get_logger
+
+logger = get_logger()
+
+RUN_LABEL = '_run'  # label of the stages which do not belong to a single deployment
+
+
+class StageTiming:
+    label: str
+    source_sha: Optional[str]
+    stage: str
+    started_at: datetime
+    wall_seconds: float
+    cpu_seconds: Optional[float]
+    max_rss_kb: Optional[int]
+    peak_memory_kb: Optional[int]  # of the cgroup of the command, including all its children
+    success: bool
+
+    def __init__(self, label: str, source_sha: Optional[str], stage: str, started_at: datetime):
+        self.label = label
+        self.source_sha = source_sha
+        self.stage = stage
+        self.started_at = started_at
+        self.wall_seconds = 0.0
+        self.cpu_seconds = None
+        self.max_rss_kb = None
+        self.peak_memory_kb = None
+        self.success = False
+
+    def __repr__(self):
+        return 'StageTiming(' + repr(self.label) + ', ' + repr(self.stage) + ', ' + \
+               repr(round(self.wall_seconds, 3)) + ', ' + repr(self.cpu_seconds) + ', ' + \
+               repr(self.max_rss_kb) + ', ' + repr(self.peak_memory_kb) + ', ' + repr(self.success) + ')'
+
+
+class StageTimer:
+    """
+    Collects wall time, CPU time and peak RSS of the stages of all deployments of a run.
+
+    Stages running in the deployer process are measured with the CPU time of the current thread,
+    subprocess stages set the CPU time and peak RSS of the child (``os.wait4``) on their timing, and the peak
+    memory of its cgroup if it ran in one (``StageCgroup``).
+    """
+    _timings: List[StageTiming]
+    _latest: Dict[Tuple[str, str], StageTiming]
+    _source_shas: Dict[str, str]
+    _running: Dict[str, List[StageTiming]]  # label -> nested stages in progress
+    on_change: Optional[Callable[[], None]]  # called after a stage started or ended
+    _lock: threading.Lock
+
+    def __init__(self):
+        self._timings = []
+        self._latest = {}
+        self._source_shas = {}
+        self._running = {}
+        self.on_change = None
+        self._lock = threading.Lock()
+
+    def set_source_sha(self, label: str, source_sha: str):
+        """Associate all following stages of the label with the commit being deployed."""
+        with self._lock:
+            self._source_shas[label] = source_sha
+
+    @contextmanager
+    def measure(self, label: str, stage: str):
+        with self._lock:
+            source_sha = self._source_shas.get(label)
+            timing = StageTiming(label, source_sha, stage, datetime.now())
+            self._running.setdefault(label, []).append(timing)
+        self._notify()
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            yield timing
+            timing.success = True
+        finally:
+            timing.wall_seconds = time.perf_counter() - start_wall
+            if timing.cpu_seconds is None:
+                timing.cpu_seconds = time.thread_time() - start_cpu
+            logger.debug(f"Stage '{stage}' of {label} took {timing.wall_seconds:.2f}s "
+                         f"(CPU {timing.cpu_seconds:.2f}s" +
+                         (f", peak RSS {timing.max_rss_kb} kB" if timing.max_rss_kb is not None else "") +
+                         (f", peak memory {timing.peak_memory_kb} kB)" if timing.peak_memory_kb is not None else ")"))
+            with self._lock:
+                self._timings.append(timing)
+                self._latest[(label, stage)] = timing
+                running = self._running.get(label, [])
+                if timing in running:
+                    running.remove(timing)
+                if not running:
+                    self._running.pop(label, None)
+            self._notify()
+
+    def running(self) -> Dict[str, StageTiming]:
+        """The innermost stage in progress of every label."""
+        with self._lock:
+            return {label: stages[-1] for label, stages in self._running.items() if stages}
+
+    def _notify(self):
+        if self.on_change is not None:
+            try:
+                self.on_change()
+            except Exception as e:
+                logger.warning(f"Failed to report the progress of a stage: {e}")
+
+    def pop_timings(self) -> List[StageTiming]:
+        with self._lock:
+            timings = self._timings
+            self._timings = []
+        return timings
+
+    def forget(self, label: str):
+        """Remove the latest timings of a deleted deployment from the export."""
+        with self._lock:
+            self._source_shas.pop(label, None)
+            for key in [key for key in self._latest if key[0] == label]:
+                del self._latest[key]
+
+    def write_prometheus_textfile(self):
+        """Export the latest timing of every stage for the textfile collector of the Prometheus node exporter."""
+        if not Config.PROMETHEUS_TEXTFILE:
+            return
+        with self._lock:
+            timings = sorted(self._latest.values(), key=lambda x: (x.label, x.stage))
+        # every metric family is written as one group: HELP, TYPE and all of its samples
+        families = [
+            ('prdeployer_stage_duration_seconds', 'Wall time of the last run of a deployment stage.',
+             lambda timing: f'{timing.wall_seconds:.3f}'),
+            ('prdeployer_stage_cpu_seconds', 'CPU time of the last run of a deployment stage.',
+             lambda timing: None if timing.cpu_seconds is None else f'{timing.cpu_seconds:.3f}'),
+            ('prdeployer_stage_max_rss_bytes', 'Peak RSS of the child process of the last run of a stage.',
+             lambda timing: None if timing.max_rss_kb is None else str(timing.max_rss_kb * 1024)),
+            ('prdeployer_stage_peak_memory_bytes', 'Peak memory of the cgroup of the last run of a stage.',
+             lambda timing: None if timing.peak_memory_kb is None else str(timing.peak_memory_kb * 1024)),
+            ('prdeployer_stage_success', 'Whether the last run of a deployment stage succeeded.',
+             lambda timing: str(int(timing.success))),
+        ]
+        lines = []
+        for name, description, value in families:
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} gauge')
+            for timing in timings:
+                sample = value(timing)
+                if sample is not None:
+                    labels = '{label="%s",stage="%s"}' % (StageTimer._escape(timing.label),
+                                                          StageTimer._escape(timing.stage))
+                    lines.append(f'{name}{labels} {sample}')
+        lines.append('# HELP prdeployer_last_run_timestamp_seconds Time of the last deployer run.')
+        lines.append('# TYPE prdeployer_last_run_timestamp_seconds gauge')
+        lines.append(f'prdeployer_last_run_timestamp_seconds {time.time():.0f}')
+
+        # the collector must never read a partially written file
+        tmp_path = Config.PROMETHEUS_TEXTFILE + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+            os.replace(tmp_path, Config.PROMETHEUS_TEXTFILE)
+        except OSError as e:
+            logger.warning(f"Failed to write Prometheus textfile {Config.PROMETHEUS_TEXTFILE}: {e}")
+
+    @staticmethod
+    def _escape(value: str) -> str:
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,320 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from html import escape
+from string import Template
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlparse
+
+import pymysql
+
+from config import Config
+from deployment_store import DeploymentStore
+from logger import get_logger
+from scheduler import Job, Scheduler
+from stage_timer import StageTimer, StageTiming
+
+logger = get_logger()
+
+
+class StatusPage:
+    """
+    Writes the index page as static ``index.html`` plus ``status.json`` into ``Config.STATUS_PAGE_FOLDER``.
+
+    Both are rendered from the in-memory rows of the store, so page views need neither PHP nor the database.
+    The page is written whenever a job finished and whenever the state is flushed; ``status.json`` additionally
+    contains the running jobs and their current stage, it is rewritten at most every
+    ``Config.STATUS_PAGE_PROGRESS_INTERVAL`` seconds while stages start and end. Files are only replaced
+    (atomically) if their content changed, so that the ETag of nginx stays valid.
+    """
+    ACTIONS = {
+        Scheduler.BRANCH: 'deploying branch',
+        Scheduler.WAKE: 'waking up',
+        Scheduler.PUSH: 'deploying',
+        Scheduler.RETRY: 'retrying',
+        Scheduler.SUSPEND: 'suspending',
+        Scheduler.DELETE: 'deleting',
+    }
+
+    store: DeploymentStore
+    timer: StageTimer
+    _template: Optional[Template]  # only loaded if the page is written
+    _stages: Dict[str, Dict[str, float]]  # label -> stage -> summed wall seconds of the deployed commit
+    _stage_shas: Dict[str, str]
+    _running: Dict[str, Tuple[str, datetime]]  # label -> action, started at
+    _last_run: Optional[str]
+    _written: Dict[str, str]
+    _last_progress_write: float
+    _lock: threading.RLock
+
+    def __init__(self, store: DeploymentStore, timer: StageTimer):
+        self.store = store
+        self.timer = timer
+        self._template = None
+        if Config.STATUS_PAGE_FOLDER:
+            with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'status-page.template'), 'r') as f:
+                self._template = Template(f.read())
+        self._stages = {}
+        self._stage_shas = {}
+        self._running = {}
+        self._last_run = self._read_last_run()
+        self._written = {}
+        self._last_progress_write = 0.0
+        self._lock = threading.RLock()
+
+    def load(self, connection: pymysql.Connection):
+        """Load the stage timings of the deployed commits, later ones are added by add_timings()."""
+        if not Config.STATUS_PAGE_FOLDER:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT s.`label`, s.`source_sha`, s.`stage`, SUM(s.`wall_seconds`) AS `wall_seconds` "
+                           "FROM deployment.deployment_stage s JOIN deployment.deployment d "
+                           "ON d.`label` = s.`label` AND d.`source_sha` = s.`source_sha` "
+                           "GROUP BY s.`label`, s.`source_sha`, s.`stage` ORDER BY s.`label`, MIN(s.`started_at`)")
+            rows = cursor.fetchall()
+        connection.commit()
+        with self._lock:
+            self._stages = {}
+            self._stage_shas = {}
+            for row in rows:
+                self._stages.setdefault(row['label'], {})[row['stage']] = float(row['wall_seconds'])
+                self._stage_shas[row['label']] = row['source_sha']
+
+    def add_timings(self, timings: List[StageTiming]):
+        with self._lock:
+            for timing in timings:
+                row = self.store.get(timing.label)
+                if row is None or timing.source_sha is None or timing.source_sha != row.get('source_sha'):
+                    continue
+                if self._stage_shas.get(timing.label) != timing.source_sha:
+                    self._stages[timing.label] = {}
+                    self._stage_shas[timing.label] = timing.source_sha
+                stages = self._stages[timing.label]
+                stages[timing.stage] = stages.get(timing.stage, 0.0) + timing.wall_seconds
+
+    def start(self, job: Job):
+        with self._lock:
+            self._running[job.label] = (self.ACTIONS.get(job.priority, 'working'), datetime.now())
+        self.write_progress(force=True)
+
+    def finish(self, job: Job):
+        with self._lock:
+            self._running.pop(job.label, None)
+        self.write()
+
+    def record_run(self, finished_at: datetime):
+        with self._lock:
+            self._last_run = finished_at.strftime("%Y-%m-%d %H:%M:%S")
+        self.write()
+
+    def write_progress(self, force: bool = False):
+        """Write status.json, unless it was written less than STATUS_PAGE_PROGRESS_INTERVAL seconds ago."""
+        if not Config.STATUS_PAGE_FOLDER:
+            return
+        with self._lock:
+            if not force and time.monotonic() - self._last_progress_write < Config.STATUS_PAGE_PROGRESS_INTERVAL:
+                return
+            self._last_progress_write = time.monotonic()
+            rows = self._sorted_rows()
+            self._replace('status.json', json.dumps(self._status(rows), separators=(',', ':'), default=str))
+
+    def write(self):
+        if not Config.STATUS_PAGE_FOLDER:
+            return
+        with self._lock:
+            self._last_progress_write = time.monotonic()
+            rows = self._sorted_rows()
+            status = self._status(rows)
+            html = self._template.substitute(
+                in_progress=self._render_in_progress(status['in_progress']),
+                deployments='\n'.join(self._render_row(row) for row in rows if not row.get('fail_count')),
+                failed=self._render_failed([row for row in rows if row.get('fail_count')]),
+                last_run=escape(self._last_run or ''),
+                version=status['version'],
+                host_pattern=json.dumps(urlparse(Config.STATUS_PAGE_URL_TEMPLATE).hostname or ''),
+            )
+            self._replace('status.json', json.dumps(status, separators=(',', ':'), default=str))
+            self._replace('index.html', html)
+
+    def _sorted_rows(self) -> List[Dict[str, Any]]:
+        # in the order of the former index.php: by type (pull requests first), then the latest deployments
+        rows = sorted(self.store.all_rows(), key=lambda r: r.get('deployed_at') or datetime.min, reverse=True)
+        return sorted(rows, key=lambda r: r.get('type') or '', reverse=True)
+
+    def _status(self, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        deployments = []
+        for row in rows:
+            deployment = {key: self._json_value(row.get(key)) for key in (
+                'label', 'type', 'title', 'author', 'url', 'source_sha', 'deployed_at', 'fail_count',
+                'failure_class', 'next_retry_at', 'last_access_at', 'suspended_at', 'suspended_bytes', 'disk_bytes',
+                'database_bytes', 'healthy', 'cold_ttfb_ms', 'warm_ttfb_ms')}
+            deployment['build_seconds'] = round(sum(self._stages.get(row['label'], {}).values()), 1)
+            deployments.append(deployment)
+        running_stages = self.timer.running()
+        in_progress = []
+        for label, (action, started_at) in sorted(self._running.items(), key=lambda x: x[1][1]):
+            stage = running_stages.get(label)
+            in_progress.append({
+                'label': label,
+                'action': action,
+                'started_at': started_at.isoformat(timespec='seconds'),
+                'stage': None if stage is None else stage.stage,
+                'stage_started_at': None if stage is None else stage.started_at.isoformat(timespec='seconds'),
+            })
+        version = hashlib.sha1(json.dumps(deployments, default=str).encode('utf-8')).hexdigest()[:12]
+        return {'version': version, 'last_run': self._last_run, 'in_progress': in_progress,
+                'deployments': deployments}
+
+    @staticmethod
+    def _json_value(value):
+        return value.isoformat(sep=' ', timespec='seconds') if isinstance(value, datetime) else value
+
+    @staticmethod
+    def _render_in_progress(in_progress: List[Dict[str, Any]]) -> str:
+        if not in_progress:
+            return ''
+        items = ''.join(f"<li>{escape(item['label'])}: {escape(item['action'])}"
+                        f"{', ' + escape(item['stage']) if item['stage'] else ''} "
+                        f"(since {escape(item['stage_started_at'] or item['started_at'])})</li>"
+                        for item in in_progress)
+        return f'<ul class="list-unstyled alert alert-info mt-4">{items}</ul>'
+
+    def _render_row(self, row: Dict[str, Any]) -> str:
+        url = Config.STATUS_PAGE_URL_TEMPLATE % row['label']
+        if row.get('type') == 'pr':
+            deployment_type = self._icon('icon-pr', 12, 16) + ' PR'
+        elif row.get('type') == 'branch':
+            deployment_type = self._icon('icon-branch', 10, 16) + ' Branch'
+        else:
+            deployment_type = self._text(row.get('type'))
+        last_access = self._text(row.get('last_access_at')) or '-'
+        if row.get('suspended_at') is not None:
+            last_access += (f'<br><span class="badge badge-secondary" title="Suspended since '
+                            f'{self._text(row["suspended_at"])}">Suspended</span> '
+                            f'<small>{self._format_bytes(row.get("suspended_bytes") or 0)} freed</small>')
+        if row.get('disk_bytes') is not None:
+            disk_usage = (f'{self._format_bytes(row["disk_bytes"] + (row.get("database_bytes") or 0))}'
+                          f'<br><small>{self._format_bytes(row.get("database_bytes") or 0)} database</small>')
+        else:
+            disk_usage = '-'
+        actions = [f'<a href="{escape(url)}" target="_blank">{self._icon("icon-open", 512, 512)}</a>',
+                   f'<a href="{self._text(row.get("url"))}" target="_blank">{self._icon("icon-github", 496, 512)}</a>']
+        if row.get('suspended_at') is not None:
+            actions.append(self._button('wake.php', row['label'], 'Wake up'))
+        actions += self._log_button(row['label'])
+        return self._tr([
+            f'<a href="{escape(url)}">{escape(row["label"])}</a>', deployment_type, self._text(row.get('title')),
+            self._text(row.get('author')), self._hash(row.get('source_sha')), self._text(row.get('deployed_at')),
+            last_access, self._render_stages(row['label']), self._render_warm_up(row), disk_usage,
+        ], actions)
+
+    def _render_failed(self, rows: List[Dict[str, Any]]) -> str:
+        if not rows:
+            return ''
+        trs = []
+        for row in rows:
+            url = Config.STATUS_PAGE_URL_TEMPLATE % row['label']
+            actions = [f'<a href="{self._text(row.get("url"))}">{self._icon("icon-github", 496, 512)}</a>']
+            trs.append(self._tr([
+                f'<a href="{escape(url)}">{escape(row["label"])}</a>', self._text(row.get('title')),
+                self._text(row.get('author')), self._hash(row.get('source_sha')), self._text(row.get('deployed_at')),
+                self._text(row.get('fail_count')), self._text(row.get('failure_class')),
+                self._text(row.get('next_retry_at')) or 'waiting for a new commit', self._render_stages(row['label']),
+            ], actions + self._log_button(row['label'])))
+        header = ''.join(f'<th scope="col">{name}</th>' for name in (
+            'Label', 'Title', 'Author', 'Commit', 'Deploy Date', 'Fail Count', 'Failure', 'Next Retry', 'Build Time',
+            ''))
+        return ('    <h3>Failed deploying the following pull requests</h3>\n'
+                '    <table class="table table-responsive-md mt-4">\n'
+                f'        <thead><tr>{header}</tr></thead>\n'
+                '        <tbody>\n' + '\n'.join(trs) + '\n        </tbody>\n    </table>\n'
+                '    <p>Network, disk and timeout failures are retried with an increasing delay. Build failures are '
+                'not retried, the system waits until the commit hash changes.</p>')
+
+    @staticmethod
+    def _render_warm_up(row: Dict[str, Any]) -> str:
+        if row.get('healthy') is None:
+            return '-'
+        badge = ('<span class="badge badge-success">Healthy</span>' if row['healthy'] else
+                 '<span class="badge badge-danger" title="The warm-up failed, see the log">Unhealthy</span>')
+        if row.get('cold_ttfb_ms') is None:
+            return badge
+        return (f'{badge}<br><small>{int(row["cold_ttfb_ms"])} ms cold</small>'
+                f'<br><small>{int(row.get("warm_ttfb_ms") or 0)} ms warm</small>')
+
+    def _render_stages(self, label: str) -> str:
+        stages = self._stages.get(label)
+        if not stages:
+            return ''
+        rows = ''.join(f'<tr><td>{escape(stage)}</td><td>{seconds:.1f} s</td></tr>'
+                       for stage, seconds in stages.items())
+        return f'<details class="stages"><summary>{sum(stages.values()):.0f} s</summary><table>{rows}</table></details>'
+
+    def _log_button(self, label: str) -> List[str]:
+        if not os.path.exists(os.path.join(Config.LABEL_LOG_FILE_DIRECTORY, label + '.txt')):
+            return []
+        return [self._button('log.php', label, 'Log')]
+
+    @staticmethod
+    def _button(page: str, label: str, text: str) -> str:
+        return (f'<a href="{page}?label={quote(label)}" class="btn btn-secondary btn-sm mt-1 text-uppercase">'
+                f'{text}</a>')
+
+    @staticmethod
+    def _tr(cells: List[str], actions: List[str]) -> str:
+        return ('            <tr>' + ''.join(f'<td>{cell}</td>' for cell in cells) +
+                '<td class="actions">' + ''.join(actions) + '</td></tr>')
+
+    @staticmethod
+    def _icon(name: str, width: int, height: int) -> str:
+        return f'<svg viewBox="0 0 {width} {height}" aria-hidden="true"><use href="#{name}"></use></svg>'
+
+    @staticmethod
+    def _hash(sha: Optional[str]) -> str:
+        return f'<code class="hash" title="{escape(sha or "")}">{escape(sha or "")}</code>'
+
+    @staticmethod
+    def _text(value) -> str:
+        if value is None:
+            return ''
+        if isinstance(value, datetime):
+            value = value.strftime("%Y-%m-%d %H:%M:%S")
+        return escape(str(value))
+
+    @staticmethod
+    def _format_bytes(size: int) -> str:
+        units = ['B', 'KB', 'MB', 'GB', 'TB']
+        i = 0
+        size = float(size)
+        while size >= 1024 and i < len(units) - 1:
+            size /= 1024
+            i += 1
+        return f'{size:.1f} {units[i]}' if i else f'{int(size)} {units[i]}'
+
+    def _replace(self, name: str, content: str):
+        if self._written.get(name) == content:
+            return
+        path = os.path.join(Config.STATUS_PAGE_FOLDER, name)
+        # nginx must never serve a partially written file
+        tmp_path = os.path.join(Config.STATUS_PAGE_FOLDER, f'.{name}.tmp')
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(content)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+            self._written[name] = content
+        except OSError as e:
+            logger.warning(f"Failed to write the status page {path}: {e}")
+
+    @staticmethod
+    def _read_last_run() -> Optional[str]:
+        try:
+            with open(os.path.join(Config.LABEL_LOG_FILE_DIRECTORY, 'run.log'), 'rb') as f:
+                f.seek(max(0, os.fstat(f.fileno()).st_size - 64))
+                lines = f.read().decode('utf-8', errors='replace').split()
+        except OSError:
+            return None
+        return ' '.join(lines[-2:]) if lines else None
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from logger import get_logger
+
+logger = get_logger()
+logging.getLogger('asyncio').setLevel(logging.WARNING)  # an event loop is created for every command
+
+
+class SubprocessError(Exception):
+    exit_code: Optional[int]
+    output_tail: str
+    timed_out: bool
+    stage: Optional[str]
+
+    def __init__(self, message: str, exit_code: Optional[int], output_tail: str, timed_out: bool = False,
+                 stage: str = None):
+        super().__init__(message)
+        self.exit_code = exit_code
+        self.output_tail = output_tail
+        self.timed_out = timed_out
+        self.stage = stage
+
+
+class SubprocessResult:
+    exit_code: int
+    timed_out: bool
+    cpu_seconds: float
+    max_rss_kb: int
+    output_tail: str
+
+    def __init__(self, exit_code: int, timed_out: bool, rusage, output_tail: str):
+        self.exit_code = exit_code
+        self.timed_out = timed_out
+        self.cpu_seconds = rusage.ru_utime + rusage.ru_stime
+        self.max_rss_kb = rusage.ru_maxrss
+        self.output_tail = output_tail
+
+
+class OutputTail:
+    """Ring buffer which keeps the last max_bytes of output, dropping whole lines."""
+    max_bytes: int
+    _lines: Deque[bytes]
+    _size: int
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lines = deque()
+        self._size = 0
+
+    def append(self, line: bytes):
+        line = line[-self.max_bytes:]
+        self._lines.append(line)
+        self._size += len(line)
+        while self._size > self.max_bytes:
+            self._size -= len(self._lines.popleft())
+
+    def text(self) -> str:
+        return b''.join(self._lines).decode('utf-8', errors='replace').rstrip('\n')
+
+
+class SubprocessRunner:
+    """
+    Runs a command in its own process group and streams its output line by line to a callback.
+
+    The calling thread runs an event loop until the command finished, so the output is logged by the
+    calling thread (and therefore reaches its label log handlers); several threads can run commands at
+    the same time. On timeout the whole process group is terminated, and killed after a grace period.
+    The child is reaped with ``os.wait4`` to report its CPU time and peak RSS.
+    """
+    KILL_GRACE_SECONDS = 10
+    OUTPUT_DRAIN_SECONDS = 5  # processes which outlive the command may keep its output pipe open
+    READ_CHUNK_BYTES = 64 * 1024
+
+    tail_bytes: int
+
+    def __init__(self, tail_bytes: int):
+        self.tail_bytes = tail_bytes
+
+    def run(self, command: List[str], cwd: str = None, env: Dict[str, str] = None, timeout: float = None,
+            on_line: Callable[[str], None] = None) -> SubprocessResult:
+        return asyncio.run(self._run(command, cwd, env, timeout, on_line))
+
+    async def _run(self, command: List[str], cwd: Optional[str], env: Optional[Dict[str, str]],
+                   timeout: Optional[float], on_line: Optional[Callable[[str], None]]) -> SubprocessResult:
+        loop = asyncio.get_running_loop()
+        tail = OutputTail(self.tail_bytes)
+        p = subprocess.Popen(command, cwd=cwd, env=None if env is None else dict(os.environ, **env),
+                             stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                             start_new_session=True)
+        reader = asyncio.StreamReader()
+        transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), p.stdout)
+        output = asyncio.ensure_future(self._read_output(reader, tail, on_line))
+        # wait4 blocks, the loop keeps reading the output meanwhile
+        wait = loop.run_in_executor(None, os.wait4, p.pid, 0)
+
+        timed_out = False
+        try:
+            await asyncio.wait_for(asyncio.shield(wait), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            logger.warning(f"Command {command[0]} timed out after {timeout:.0f}s, terminate its process group")
+            self._kill_group(p.pid, signal.SIGTERM)
+            try:
+                await asyncio.wait_for(asyncio.shield(wait), self.KILL_GRACE_SECONDS)
+            except asyncio.TimeoutError:
+                self._kill_group(p.pid, signal.SIGKILL)
+        _, status, rusage = await wait
+        p.returncode = os.waitstatus_to_exitcode(status)
+        if timed_out:
+            self._kill_group(p.pid, signal.SIGKILL)  # children which ignored SIGTERM and outlived the command
+
+        try:
+            await asyncio.wait_for(output, self.OUTPUT_DRAIN_SECONDS)
+        except asyncio.TimeoutError:
+            logger.debug(f"Stop reading the output of {command[0]}, it is still open after the command exited")
+        finally:
+            transport.close()
+        return SubprocessResult(p.returncode, timed_out, rusage, tail.text())
+
+    async def _read_output(self, reader: asyncio.StreamReader, tail: OutputTail,
+                           on_line: Optional[Callable[[str], None]]):
+        pending = b''
+        while True:
+            chunk = await reader.read(self.READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                self._emit(line + b'\n', tail, on_line)
+        if pending:
+            self._emit(pending, tail, on_line)
+
+    @staticmethod
+    def _emit(line: bytes, tail: OutputTail, on_line: Optional[Callable[[str], None]]):
+        tail.append(line)
+        if on_line is not None:
+            on_line(line.decode('utf-8', errors='replace').rstrip('\n'))
+
+    @staticmethod
+    def _kill_group(pid: int, sig: int):
+        try:
+            os.killpg(pid, sig)
+        except ProcessLookupError:
+            pass
+
+
+class DeadlineTracker:
+    """Overall time budget of the deployment of each label, limits the timeouts of its commands."""
+    _deadlines: Dict[str, float]
+
+    def __init__(self):
+        self._deadlines = {}
+
+    def start(self, label: str, seconds: Optional[float]):
+        if seconds:
+            self._deadlines[label] = time.monotonic() + seconds
+
+    def clear(self, label: str):
+        self._deadlines.pop(label, None)
+
+    def timeout(self, label: str, timeout: Optional[float]) -> Optional[float]:
+        """The timeout of a command of the label, bounded by the remaining budget of the label."""
+        deadline = self._deadlines.get(label)
+        if deadline is None:
+            return timeout
+        remaining = max(0.0, deadline - time.monotonic())
+        return remaining if timeout is None else min(timeout, remaining)
@@ -0,0 +1,133 @@
+import http.client
+import os
+import ssl
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+from urllib.parse import urlparse
+
+from config import Config
+from lifecycle import Lifecycle
+from logger import get_logger
+from stage_timer import StageTimer
+
+logger = get_logger()
+
+
+class WarmUpResult:
+    healthy: bool
+    cold_ttfb_ms: Optional[int]  # slowest first request of the smoke URLs
+    warm_ttfb_ms: Optional[int]  # slowest second request
+    errors: List[str]
+
+    def __init__(self):
+        self.healthy = True
+        self.cold_ttfb_ms = None
+        self.warm_ttfb_ms = None
+        self.errors = []
+
+    def fail(self, error: str):
+        self.healthy = False
+        self.errors.append(error)
+
+
+class WarmUp:
+    """
+    Warms up a deployment once its site is served, so that the first reviewer does not wait for cold caches.
+
+    ``cache:warmup`` builds the Symfony cache (for a new release before it is activated, see ``warm_cache()``),
+    then every path of ``Config.WARMUP_URLS`` is requested twice from
+    the local nginx: the first request fills OPcache of the PHP-FPM pool (cold time to first byte), the second
+    one shows the warm time. The deployment is healthy if every step succeeded and every response has a status
+    below 400. The smoke requests do not count as access of the deployment (see ``Lifecycle.last_access()``).
+    """
+    _run_subprocess: Callable
+    _timer: StageTimer
+
+    def __init__(self, run_subprocess: Callable, timer: StageTimer):
+        self._run_subprocess = run_subprocess
+        self._timer = timer
+
+    def warm_cache(self, label: str, git_folder: str):
+        """Build the Symfony cache, raises if the application does not boot."""
+        self._run_subprocess("sudo -u www-data php bin/console cache:warmup", label, "warm up Symfony cache",
+                             git_folder, timeout=Config.WARMUP_TIMEOUT, stage='cache')
+
+    def run(self, label: str, git_folder: str = None) -> WarmUpResult:
+        """Warm up the served deployment, without git_folder its Symfony cache is warm already."""
+        result = WarmUpResult()
+        if git_folder is not None:
+            try:
+                self.warm_cache(label, git_folder)
+            except Exception as e:
+                result.fail(str(e))
+                return result
+        if Config.WARMUP_URLS:
+            with self._timer.measure(label, 'smoke test'), self._keep_last_access(label):
+                self._smoke_test(label, result)
+        if result.healthy:
+            logger.info(f"Warmed up {label}, time to first byte {self._format(result.cold_ttfb_ms)} cold, "
+                        f"{self._format(result.warm_ttfb_ms)} warm")
+        else:
+            logger.warning(f"Warm-up of {label} failed: {'; '.join(result.errors)}")
+        return result
+
+    def _smoke_test(self, label: str, result: WarmUpResult):
+        host = urlparse(Config.STATUS_PAGE_URL_TEMPLATE % label).hostname
+        for attempt in ('cold', 'warm'):
+            slowest = 0
+            for path in Config.WARMUP_URLS:
+                try:
+                    status, seconds = self._request(host, path)
+                except Exception as e:
+                    result.fail(f"GET {path} ({attempt}): {e}")
+                    continue
+                logger.debug(f"GET {path} of {label} ({attempt}): {status} after {seconds * 1000:.0f} ms")
+                if status >= 400:
+                    result.fail(f"GET {path} ({attempt}): status {status}")
+                slowest = max(slowest, round(seconds * 1000))
+            if attempt == 'cold':
+                result.cold_ttfb_ms = slowest
+            else:
+                result.warm_ttfb_ms = slowest
+
+    @staticmethod
+    def _request(host: str, path: str):
+        """Status and time to first byte of a GET request to the local nginx, the site has a self-signed certificate."""
+        connection = http.client.HTTPSConnection(Config.WARMUP_ADDRESS, timeout=Config.WARMUP_TIMEOUT,
+                                                 context=ssl._create_unverified_context())
+        try:
+            started = time.monotonic()
+            connection.request('GET', path, headers={'Host': host, 'User-Agent': 'prdeployer-warmup'})
+            response = connection.getresponse()
+            seconds = time.monotonic() - started
+            response.read()
+            return response.status, seconds
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _format(ms: Optional[int]) -> str:
+        return '-' if ms is None else f'{ms} ms'
+
+    @staticmethod
+    @contextmanager
+    def _keep_last_access(label: str):
+        """Restores the modification time of the access log, an access log created by the requests is emptied."""
+        path = Lifecycle.access_log(label)
+        try:
+            stat = os.stat(path)
+            times = (stat.st_atime, stat.st_mtime)
+        except FileNotFoundError:
+            times = None
+        try:
+            yield
+        finally:
+            try:
+                if times is None:
+                    # nginx appends to the file it has open, truncating it is safe (like logrotate copytruncate)
+                    os.truncate(path, 0)
+                else:
+                    os.utime(path, times)
+            except OSError:
+                pass
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Worker of the multi-host mode: runs the jobs which the coordinator queued for this host.
+
+With ``Config.JOB_QUEUE``, ``Deployer.run()`` (cron job or daemon) only queues jobs in the ``deployment_job``
+table of ``Config.STATE_MYSQL_HOST``. Every host runs one worker with ``Config.MAX_PARALLEL_DEPLOYMENTS`` threads,
+each claims and runs one job at a time. A heartbeat registers the host with its free disk space and load and
+extends the leases of its running jobs; the jobs of a worker that died are claimed again once their lease expired.
+Every ``Config.WORKER_HOUSEKEEPING_INTERVAL`` seconds, the worker stops claiming jobs and records accesses,
+suspends idle deployments, removes orphans and measures the disk usage of the deployments on its host.
+Wake-up requests of its suspended sites are queued as jobs for this host.
+
+Several workers can run on one machine for testing, each with its own ``--host`` name.
+"""
+import argparse
+import threading
+import time
+from typing import Dict
+
+from config import Config
+from job_queue import JobQueue, QueuedJob
+from lifecycle import Lifecycle
+from logger import get_logger
+from prdeployer import Deployer
+
+logger = get_logger()
+
+
+class JobWorker:
+    deployer: Deployer
+    _running: Dict[int, QueuedJob]
+    _active: int
+    _paused: bool
+    _condition: threading.Condition
+
+    def __init__(self):
+        self.deployer = Deployer()
+        self._running = {}
+        self._active = 0
+        self._paused = False
+        self._condition = threading.Condition()
+
+    def run(self):
+        JobQueue.check_address(Config.HOST_ADDRESS)
+        logger.info(f"Worker of host {Config.HOST_NAME} started")
+        self.deployer.run_worker_task(self._heartbeat)
+        for i in range(max(1, Config.MAX_PARALLEL_DEPLOYMENTS)):
+            threading.Thread(target=self._work, name=f'deploy_{i}', daemon=True).start()
+        threading.Thread(target=self._beat, name='heartbeat', daemon=True).start()
+        threading.Thread(target=self._watch_wake_requests, name='wake', daemon=True).start()
+        self._housekeep()
+
+    def _work(self):
+        while True:
+            self._enter()
+            try:
+                found = self.deployer.run_worker_task(self._claim_and_run)
+            except Exception as e:
+                logger.error(e)
+                found = False
+            finally:
+                self._leave()
+            if not found:
+                time.sleep(Config.JOB_POLL_INTERVAL)
+
+    def _claim_and_run(self) -> bool:
+        connection = self.deployer.state_connection
+        job = JobQueue.claim(connection, Config.HOST_NAME)
+        if job is None:
+            return False
+        logger.info(f"Run {job.action} job {job.id} of {job.label}")
+        with self._condition:
+            self._running[job.id] = job
+        try:
+            self.deployer.run_queued_job(job)
+        except Exception as e:
+            logger.error(e)
+            JobQueue.complete(connection, job, Config.HOST_NAME, str(e))
+        else:
+            JobQueue.complete(connection, job, Config.HOST_NAME)
+        finally:
+            with self._condition:
+                del self._running[job.id]
+        self.deployer.nginx.request_reload()
+        return True
+
+    def _beat(self):
+        while True:
+            time.sleep(Config.JOB_LEASE_SECONDS / 4)
+            try:
+                self.deployer.run_worker_task(self._heartbeat)
+            except Exception as e:
+                logger.error(e)
+
+    def _heartbeat(self):
+        with self._condition:
+            job_ids = list(self._running)
+        connection = self.deployer.state_connection
+        JobQueue.register_host(connection, Config.HOST_NAME, Config.HOST_ADDRESS)
+        JobQueue.extend_leases(connection, Config.HOST_NAME, job_ids)
+
+    def _watch_wake_requests(self):
+        # suspended sites of this host write their wake-up requests here, they are queued as jobs for this host
+        while True:
+            for label in Lifecycle.wake_requests():
+                try:
+                    self.deployer.run_worker_task(self.deployer.process_wake_request, label)
+                except Exception as e:
+                    logger.error(e)
+            time.sleep(Config.WAKE_POLL_INTERVAL)
+
+    def _housekeep(self):
+        while True:
+            logger.info(f"Housekeeping of host {Config.HOST_NAME}")
+            # orphans are only detected reliably while no deployment of this host is in progress
+            self._pause()
+            try:
+                self.deployer.run_worker_task(self.deployer.process_housekeeping)
+            except Exception as e:
+                logger.error(e)
+            finally:
+                self._resume()
+            time.sleep(Config.WORKER_HOUSEKEEPING_INTERVAL)
+
+    def _enter(self):
+        with self._condition:
+            while self._paused:
+                self._condition.wait()
+            self._active += 1
+
+    def _leave(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def _pause(self):
+        with self._condition:
+            self._paused = True
+            while self._active:
+                self._condition.wait()
+
+    def _resume(self):
+        with self._condition:
+            self._paused = False
+            self._condition.notify_all()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default=Config.HOST_NAME, help="name of this host in the job queue")
+    parser.add_argument('--address', default=Config.HOST_ADDRESS,
+                        help="IP address (ip:port) the front end proxies the deployments of this host to")
+    args = parser.parse_args()
+    Config.HOST_NAME = args.host
+    Config.HOST_ADDRESS = args.address
+    JobWorker().run()
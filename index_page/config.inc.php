@@ -7,3 +7,6 @@ $db_password = 'INDEX_DB_PASSWORD';
 $db_name = 'deployment';
 
 $url_template = 'https://%s.web-test.catrobat.org/app/';
+
+// must match WAKE_REQUEST_FOLDER of the deployer config, writable by the PHP user
+$wake_folder = '/var/www/index/wake/';
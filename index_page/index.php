@@ -23,7 +23,7 @@ function show_db_failure()
   exit(3);
 }
 
-$res = $db->query("SELECT `label`, `type`, `source_sha`, `deployed_at`, `title`, `url`, `author`, `fail_count` FROM `deployment` ORDER BY `type` DESC, `deployed_at` DESC");
+$res = $db->query("SELECT `label`, `type`, `source_sha`, `deployed_at`, `title`, `url`, `author`, `fail_count`, `failure_class`, `next_retry_at`, `last_access_at`, `suspended_at`, `suspended_bytes`, `disk_bytes`, `database_bytes`, `healthy`, `cold_ttfb_ms`, `warm_ttfb_ms` FROM `deployment` ORDER BY `type` DESC, `deployed_at` DESC");
 if (!$res)
 {
   show_db_failure();
@@ -40,7 +40,47 @@ while ($row = $res->fetch_assoc())
   }
 }
 
+// Timings of the stages of the deployed commits, summed over all attempts
+$res = $db->query("SELECT s.`label`, s.`stage`, SUM(s.`wall_seconds`) AS `wall_seconds`, SUM(s.`cpu_seconds`) AS `cpu_seconds` FROM `deployment_stage` s JOIN `deployment` d ON d.`label` = s.`label` AND d.`source_sha` = s.`source_sha` GROUP BY s.`label`, s.`stage` ORDER BY s.`label`, MIN(s.`started_at`)");
+if (!$res)
+{
+  show_db_failure();
+}
+$stage_data = [];
+while ($row = $res->fetch_assoc())
+{
+  $stage_data[$row['label']][] = $row;
+}
+
 $db->close();
+
+function format_bytes($bytes)
+{
+  $units = ['B', 'KB', 'MB', 'GB', 'TB'];
+  $i = 0;
+  while ($bytes >= 1024 && $i < count($units) - 1)
+  {
+    $bytes /= 1024;
+    $i++;
+  }
+  return sprintf($i ? '%.1f %s' : '%d %s', $bytes, $units[$i]);
+}
+
+function show_stage_timings($label)
+{
+  global $stage_data;
+  if (empty($stage_data[$label]))
+  {
+    return;
+  }
+  $total = array_sum(array_column($stage_data[$label], 'wall_seconds'));
+  echo '<details class="stages"><summary>' . sprintf('%.0f s', $total) . '</summary><table>';
+  foreach ($stage_data[$label] as $stage)
+  {
+    echo '<tr><td>' . htmlspecialchars($stage['stage']) . '</td><td>' . sprintf('%.1f s', $stage['wall_seconds']) . '</td></tr>';
+  }
+  echo '</table></details>';
+}
 ?>
 <!doctype html>
 <html lang="en">
@@ -88,6 +128,17 @@ $db->close();
             text-decoration: none;
         }
 
+        details.stages table
+        {
+            font-size: 0.8rem;
+        }
+
+        details.stages td
+        {
+            padding-right: 0.5rem;
+            white-space: nowrap;
+        }
+
     </style>
 </head>
 <body>
@@ -114,6 +165,10 @@ $db->close();
             <th scope="col">Author</th>
             <th scope="col">Commit</th>
             <th scope="col">Deploy Date</th>
+            <th scope="col">Last Access</th>
+            <th scope="col">Build Time</th>
+            <th scope="col">Response Time</th>
+            <th scope="col">Disk Usage</th>
             <th scope="col"></th>
         </tr>
         </thead>
@@ -142,6 +197,38 @@ $db->close();
                 <td><code class="hash"
                           alt="<?php echo $entry['source_sha']; ?>"><?php echo $entry['source_sha']; ?></code></td>
                 <td><?php echo $entry['deployed_at']; ?></td>
+                <td>
+                  <?php echo $entry['last_access_at'] ?: '-'; ?>
+                  <?php if ($entry['suspended_at'] !== null): ?>
+                      <br><span class="badge badge-secondary"
+                                title="Suspended since <?php echo $entry['suspended_at']; ?>">Suspended</span>
+                      <small><?php echo format_bytes($entry['suspended_bytes']); ?> freed</small>
+                  <?php endif; ?>
+                </td>
+                <td><?php show_stage_timings($entry['label']); ?></td>
+                <td>
+                  <?php if ($entry['healthy'] === null): ?>
+                      -
+                  <?php else: ?>
+                    <?php if ($entry['healthy']): ?>
+                          <span class="badge badge-success">Healthy</span>
+                    <?php else: ?>
+                          <span class="badge badge-danger" title="The warm-up failed, see the log">Unhealthy</span>
+                    <?php endif; ?>
+                    <?php if ($entry['cold_ttfb_ms'] !== null): ?>
+                          <br><small><?php echo (int)$entry['cold_ttfb_ms']; ?> ms cold</small>
+                          <br><small><?php echo (int)$entry['warm_ttfb_ms']; ?> ms warm</small>
+                    <?php endif; ?>
+                  <?php endif; ?>
+                </td>
+                <td>
+                  <?php if ($entry['disk_bytes'] !== null): ?>
+                    <?php echo format_bytes($entry['disk_bytes'] + $entry['database_bytes']); ?>
+                      <br><small><?php echo format_bytes($entry['database_bytes']); ?> database</small>
+                  <?php else: ?>
+                      -
+                  <?php endif; ?>
+                </td>
                 <td class="actions">
                     <a href="<?php echo $url; ?>" target="_blank">
                         <svg aria-hidden="true" height="25" viewBox="0 0 512 512">
@@ -155,7 +242,14 @@ $db->close();
                                   d="M165.9 397.4c0 2-2.3 3.6-5.2 3.6-3.3.3-5.6-1.3-5.6-3.6 0-2 2.3-3.6 5.2-3.6 3-.3 5.6 1.3 5.6 3.6zm-31.1-4.5c-.7 2 1.3 4.3 4.3 4.9 2.6 1 5.6 0 6.2-2s-1.3-4.3-4.3-5.2c-2.6-.7-5.5.3-6.2 2.3zm44.2-1.7c-2.9.7-4.9 2.6-4.6 4.9.3 2 2.9 3.3 5.9 2.6 2.9-.7 4.9-2.6 4.6-4.6-.3-1.9-3-3.2-5.9-2.9zM244.8 8C106.1 8 0 113.3 0 252c0 110.9 69.8 205.8 169.5 239.2 12.8 2.3 17.3-5.6 17.3-12.1 0-6.2-.3-40.4-.3-61.4 0 0-70 15-84.7-29.8 0 0-11.4-29.1-27.8-36.6 0 0-22.9-15.7 1.6-15.4 0 0 24.9 2 38.6 25.8 21.9 38.6 58.6 27.5 72.9 20.9 2.3-16 8.8-27.1 16-33.7-55.9-6.2-112.3-14.3-112.3-110.5 0-27.5 7.6-41.3 23.6-58.9-2.6-6.5-11.1-33.3 2.6-67.9 20.9-6.5 69 27 69 27 20-5.6 41.5-8.5 62.8-8.5s42.8 2.9 62.8 8.5c0 0 48.1-33.6 69-27 13.7 34.7 5.2 61.4 2.6 67.9 16 17.7 25.8 31.5 25.8 58.9 0 96.5-58.9 104.2-114.8 110.5 9.2 7.9 17 22.9 17 46.4 0 33.7-.3 75.4-.3 83.6 0 6.5 4.6 14.4 17.3 12.1C428.2 457.8 496 362.9 496 252 496 113.3 383.5 8 244.8 8zM97.2 352.9c-1.3 1-1 3.3.7 5.2 1.6 1.6 3.9 2.3 5.2 1 1.3-1 1-3.3-.7-5.2-1.6-1.6-3.9-2.3-5.2-1zm-10.8-8.1c-.7 1.3.3 2.9 2.3 3.9 1.6 1 3.6.7 4.3-.7.7-1.3-.3-2.9-2.3-3.9-2-.6-3.6-.3-4.3.7zm32.4 35.6c-1.6 1.3-1 4.3 1.3 6.2 2.3 2.3 5.2 2.6 6.5 1 1.3-1.3.7-4.3-1.3-6.2-2.2-2.3-5.2-2.6-6.5-1zm-11.4-14.7c-1.6 1-1.6 3.6 0 5.9 1.6 2.3 4.3 3.3 5.6 2.3 1.6-1.3 1.6-3.9 0-6.2-1.4-2.3-4-3.3-5.6-2z"></path>
                         </svg>
                     </a>
-
+                  <?php if ($entry['suspended_at'] !== null): ?>
+                      <a href="wake.php?label=<?php echo urlencode($entry['label']); ?>"
+                         class="btn btn-secondary btn-sm mt-1 text-uppercase">Wake up</a>
+                  <?php endif; ?>
+                  <?php if (file_exists('logs/' . $entry['label'] . '.txt')): ?>
+                      <a href="log.php?label=<?php echo urlencode($entry['label']); ?>"
+                         class="btn btn-secondary btn-sm mt-1 text-uppercase">Log</a>
+                  <?php endif; ?>
                 </td>
             </tr>
         <?php endforeach; ?>
@@ -172,6 +266,9 @@ $db->close();
               <th scope="col">Commit</th>
               <th scope="col">Deploy Date</th>
               <th scope="col">Fail Count</th>
+              <th scope="col">Failure</th>
+              <th scope="col">Next Retry</th>
+              <th scope="col">Build Time</th>
               <th scope="col"></th>
           </tr>
           </thead>
@@ -186,6 +283,9 @@ $db->close();
                             alt="<?php echo $entry['source_sha']; ?>"><?php echo $entry['source_sha']; ?></code></td>
                   <td><?php echo $entry['deployed_at']; ?></td>
                   <td><?php echo $entry['fail_count']; ?></td>
+                  <td><?php echo htmlspecialchars($entry['failure_class'] ?? ''); ?></td>
+                  <td><?php echo $entry['next_retry_at'] ?? 'waiting for a new commit'; ?></td>
+                  <td><?php show_stage_timings($entry['label']); ?></td>
                   <td class="actions">
                       <a href="<?php echo $entry['url']; ?>">
                           <svg aria-hidden="true" height="25" viewBox="0 0 496 512">
@@ -194,7 +294,7 @@ $db->close();
                           </svg>
                       </a>
                     <?php if (file_exists('logs/' . $entry['label'] . '.txt')): ?>
-                        <a href="logs/<?php echo $entry['label']; ?>.txt"
+                        <a href="log.php?label=<?php echo urlencode($entry['label']); ?>"
                            class="btn btn-secondary btn-sm mt-1 text-uppercase">Log</a>
                     <?php endif; ?>
                   </td>
@@ -202,7 +302,8 @@ $db->close();
           <?php endforeach; ?>
           </tbody>
       </table>
-      <p>After three failing builds, the system gives up until the commit hash changes.</p>
+      <p>Network, disk and timeout failures are retried with an increasing delay. Build failures are not retried,
+          the system waits until the commit hash changes.</p>
   <?php endif; ?>
     <p>Last script run: <span id="last-run"><?php
         $f = fopen('logs/run.log', 'r');
@@ -0,0 +1,139 @@
+<?php
+// Log of a deployment, followed live while it is running.
+// log.php?label=... shows the page, which polls log.php?label=...&offset=...&inode=... for the bytes
+// appended since the last request. offset=-1 returns the end of the file only.
+// The deployer starts a new file (new inode) per deployment and when the file reached its segment size,
+// full segments are kept as logs/{label}.txt.{n}.gz.
+
+define('_CATROWEB_INDEX', 1);
+include_once "config.inc.php";
+
+const LOG_CHUNK_BYTES = 262144;
+
+$label = isset($_GET['label']) ? $_GET['label'] : '';
+if (!preg_match('/^[A-Za-z0-9_-]{1,100}$/', $label))
+{
+  http_response_code(400);
+  header("Content-Type: text/plain");
+  echo "Invalid label." . PHP_EOL;
+  exit(1);
+}
+$path = 'logs/' . $label . '.txt';
+
+if (isset($_GET['offset']))
+{
+  header("Content-Type: application/json");
+  header("Cache-Control: no-store");
+  $offset = (int)$_GET['offset'];
+  $inode = isset($_GET['inode']) ? (int)$_GET['inode'] : 0;
+  $f = @fopen($path, 'r');
+  if ($f === false)
+  {
+    echo json_encode(['inode' => 0, 'offset' => 0, 'reset' => $inode !== 0, 'text' => '']);
+    exit(0);
+  }
+  $stat = fstat($f);
+  $reset = $stat['ino'] !== $inode || $offset > $stat['size'];
+  if ($offset < 0)
+  {
+    $offset = max(0, $stat['size'] - LOG_CHUNK_BYTES);
+  }
+  elseif ($reset)
+  {
+    $offset = 0;
+  }
+  fseek($f, $offset);
+  $text = (string)fread($f, LOG_CHUNK_BYTES);
+  fclose($f);
+  if ($reset && $offset > 0)
+  {
+    // started in the middle of the file, skip the partial first line
+    $start = strpos($text, "\n");
+    $start = $start === false ? 0 : $start + 1;
+    $offset += $start;
+    $text = substr($text, $start);
+  }
+  // complete lines only, a line (or character) being written is sent with the next request
+  $end = strrpos($text, "\n");
+  if ($end !== false)
+  {
+    $text = substr($text, 0, $end + 1);
+  }
+  echo json_encode(['inode' => $stat['ino'], 'offset' => $offset + strlen($text), 'reset' => $reset,
+    'text' => $text], JSON_INVALID_UTF8_SUBSTITUTE);
+  exit(0);
+}
+
+$segments = glob('logs/' . $label . '.txt.*.gz');
+natsort($segments);
+?>
+<!doctype html>
+<html lang="en">
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1, shrink-to-fit=no">
+    <link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/4.4.1/css/bootstrap.min.css"
+          integrity="sha384-Vkoo8x4CGsO3+Hhxv8T/Q5PaXtkKtu6ug5TOeNV6gBiFeWPGFN9MuhOf23Q9Ifjh" crossorigin="anonymous">
+    <title>Log of <?php echo htmlspecialchars($label); ?></title>
+    <style>
+        #log {
+            max-height: 80vh;
+            overflow: auto;
+            font-size: 0.75rem;
+            white-space: pre-wrap;
+        }
+    </style>
+</head>
+<body>
+<div class="container-fluid mt-4">
+    <h1>Log of <code><?php echo htmlspecialchars($label); ?></code></h1>
+    <p>
+        <a href="<?php echo htmlspecialchars($path); ?>">Current file</a>
+      <?php if (count($segments)): ?>
+          &middot; Earlier output:
+        <?php foreach ($segments as $segment): ?>
+              <a href="<?php echo htmlspecialchars($segment); ?>"><?php
+                echo htmlspecialchars(basename($segment)); ?></a>
+        <?php endforeach; ?>
+      <?php endif; ?>
+        &middot; <span id="status">Loading&hellip;</span>
+    </p>
+    <pre id="log" class="border p-2"></pre>
+</div>
+<script>
+  (function () {
+    const log = document.getElementById('log')
+    const status = document.getElementById('status')
+    const url = 'log.php?label=<?php echo urlencode($label); ?>'
+    let offset = -1
+    let inode = 0
+
+    function poll () {
+      fetch(url + '&offset=' + offset + '&inode=' + inode, { cache: 'no-store' })
+        .then(response => response.json())
+        .then(data => {
+          const follow = log.scrollTop + log.clientHeight >= log.scrollHeight - 20
+          if (data.reset) {
+            log.textContent = ''
+          }
+          log.textContent += data.text
+          if (follow) {
+            log.scrollTop = log.scrollHeight
+          }
+          offset = data.offset
+          inode = data.inode
+          status.textContent = 'Updated ' + new Date().toLocaleTimeString()
+          // a full chunk means more is waiting
+          setTimeout(poll, data.text.length >= <?php echo LOG_CHUNK_BYTES; ?> / 2 ? 0 : 2000)
+        })
+        .catch(() => {
+          status.textContent = 'Connection lost, retrying'
+          setTimeout(poll, 5000)
+        })
+    }
+
+    poll()
+  })()
+</script>
+</body>
+</html>
@@ -0,0 +1,69 @@
+<?php
+// Wake-up page of suspended deployments. nginx serves it for every request to a suspended deployment
+// (label in PRDEPLOYER_LABEL), the index page links to it with ?label=...
+// The deployer restores deployments which have a file in $wake_folder.
+
+define('_CATROWEB_INDEX', 1);
+include_once "config.inc.php";
+
+$label = isset($_SERVER['PRDEPLOYER_LABEL']) ? $_SERVER['PRDEPLOYER_LABEL'] : (isset($_GET['label']) ? $_GET['label'] : '');
+if (!preg_match('/^[A-Za-z0-9_-]{1,100}$/', $label))
+{
+  http_response_code(400);
+  header("Content-Type: text/plain");
+  echo "Invalid label." . PHP_EOL;
+  exit(1);
+}
+
+$db = new mysqli('localhost', $db_user, $db_password, $db_name);
+if ($db->connect_errno)
+{
+  http_response_code(500);
+  header("Content-Type: text/plain");
+  echo "Failed opening database." . PHP_EOL;
+  exit(2);
+}
+$stmt = $db->prepare("SELECT `suspended_at` FROM `deployment` WHERE `label` = ?");
+$stmt->bind_param('s', $label);
+$stmt->execute();
+$row = $stmt->get_result()->fetch_assoc();
+$db->close();
+
+$url = sprintf($url_template, $label);
+if (!$row)
+{
+  http_response_code(404);
+  header("Content-Type: text/plain");
+  echo "Deployment $label was not found." . PHP_EOL;
+  exit(3);
+}
+if ($row['suspended_at'] === null)
+{
+  // already awake (the nginx reload may still be pending)
+  header("Location: $url");
+  exit(0);
+}
+
+touch($wake_folder . $label);
+http_response_code(503);
+header("Retry-After: 30");
+?>
+<!doctype html>
+<html lang="en">
+<head>
+    <meta charset="utf-8">
+    <meta http-equiv="refresh" content="30">
+    <meta name="viewport" content="width=device-width, initial-scale=1, shrink-to-fit=no">
+    <link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/4.4.1/css/bootstrap.min.css"
+          integrity="sha384-Vkoo8x4CGsO3+Hhxv8T/Q5PaXtkKtu6ug5TOeNV6gBiFeWPGFN9MuhOf23Q9Ifjh" crossorigin="anonymous">
+    <title>Waking up <?php echo htmlspecialchars($label); ?></title>
+</head>
+<body>
+<div class="container mt-4">
+    <h1>Waking up <code><?php echo htmlspecialchars($label); ?></code></h1>
+    <p>This deployment was suspended on <?php echo htmlspecialchars($row['suspended_at']); ?> because nobody used it.</p>
+    <p>It is being restored now, which takes a few minutes. This page reloads automatically and leads to
+        <a href="<?php echo htmlspecialchars($url); ?>"><?php echo htmlspecialchars($url); ?></a> once it is ready.</p>
+</div>
+</body>
+</html>
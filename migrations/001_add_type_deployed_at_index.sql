@@ -0,0 +1,3 @@
+-- Index for the deployment list of the index page (ORDER BY `type`, `deployed_at`)
+ALTER TABLE `deployment`
+  ADD KEY `type_deployed_at_IDX` (`type`, `deployed_at`);
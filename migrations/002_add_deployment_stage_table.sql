@@ -0,0 +1,15 @@
+-- History of the wall time, CPU time and peak RSS of every deployment stage
+CREATE TABLE `deployment_stage` (
+  `id` bigint(20) unsigned NOT NULL AUTO_INCREMENT,
+  `label` varchar(100) NOT NULL,
+  `source_sha` varchar(40) DEFAULT NULL,
+  `stage` varchar(100) NOT NULL,
+  `started_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `wall_seconds` double NOT NULL,
+  `cpu_seconds` double DEFAULT NULL,
+  `max_rss_kb` bigint(20) unsigned DEFAULT NULL,
+  `success` tinyint(1) NOT NULL,
+  PRIMARY KEY (`id`),
+  KEY `label_source_sha_IDX` (`label`, `source_sha`),
+  KEY `started_at_IDX` (`started_at`)
+) DEFAULT CHARSET=utf8mb4;
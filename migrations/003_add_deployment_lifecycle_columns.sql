@@ -0,0 +1,5 @@
+-- Last access and suspension state of idle deployments (deploy_script/lifecycle.py)
+ALTER TABLE `deployment`
+  ADD COLUMN `last_access_at` timestamp NULL DEFAULT NULL AFTER `fail_count`,
+  ADD COLUMN `suspended_at` timestamp NULL DEFAULT NULL AFTER `last_access_at`,
+  ADD COLUMN `suspended_bytes` bigint(20) unsigned DEFAULT NULL AFTER `suspended_at`;
@@ -0,0 +1,4 @@
+-- Classified failures and retry backoff of failed deployments (deploy_script/failure.py)
+ALTER TABLE `deployment`
+  ADD COLUMN `failure_class` varchar(16) DEFAULT NULL AFTER `fail_count`,
+  ADD COLUMN `next_retry_at` timestamp NULL DEFAULT NULL AFTER `failure_class`;
@@ -0,0 +1,5 @@
+-- Disk usage of the deployments, measured by the garbage collector (deploy_script/garbage_collector.py)
+ALTER TABLE `deployment`
+  ADD COLUMN `disk_bytes` bigint(20) unsigned DEFAULT NULL AFTER `suspended_bytes`,
+  ADD COLUMN `database_bytes` bigint(20) unsigned DEFAULT NULL AFTER `disk_bytes`,
+  ADD COLUMN `disk_measured_at` timestamp NULL DEFAULT NULL AFTER `database_bytes`;
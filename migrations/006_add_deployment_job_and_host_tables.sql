@@ -0,0 +1,34 @@
+-- Job queue and hosts of the multi-host mode (JOB_QUEUE, see deploy_script/job_queue.py and worker.py)
+-- Existing deployments stay on the current server: set their host to its HOST_NAME (default: its hostname), e.g.
+-- UPDATE `deployment` SET `host` = 'web-test';
+ALTER TABLE `deployment`
+  ADD COLUMN `host` varchar(64) DEFAULT NULL AFTER `disk_measured_at`;
+
+CREATE TABLE `deployment_job` (
+  `id` bigint(20) unsigned NOT NULL AUTO_INCREMENT,
+  `label` varchar(100) NOT NULL,
+  `priority` tinyint(3) unsigned NOT NULL,
+  `action` varchar(16) NOT NULL,
+  `payload` text NOT NULL,
+  `host` varchar(64) DEFAULT NULL,
+  `state` enum('queued','running','done','failed') NOT NULL DEFAULT 'queued',
+  `leased_by` varchar(64) DEFAULT NULL,
+  `lease_expires_at` timestamp NULL DEFAULT NULL,
+  `attempts` int(10) unsigned NOT NULL DEFAULT 0,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `finished_at` timestamp NULL DEFAULT NULL,
+  `error` text DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `state_priority_IDX` (`state`, `priority`, `id`),
+  KEY `label_state_IDX` (`label`, `state`)
+) DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE `deployment_host` (
+  `host` varchar(64) NOT NULL,
+  `address` varchar(255) NOT NULL,
+  `free_bytes` bigint(20) unsigned NOT NULL,
+  `load_average` double NOT NULL,
+  `cpu_count` int(10) unsigned NOT NULL,
+  `heartbeat_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`host`)
+) DEFAULT CHARSET=utf8mb4;
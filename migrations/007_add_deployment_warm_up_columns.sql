@@ -0,0 +1,5 @@
+-- Result of the warm-up after each deployment (deploy_script/warmup.py), NULL: not warmed up yet
+ALTER TABLE `deployment`
+  ADD COLUMN `healthy` tinyint(1) DEFAULT NULL AFTER `host`,
+  ADD COLUMN `cold_ttfb_ms` int(10) unsigned DEFAULT NULL AFTER `healthy`,
+  ADD COLUMN `warm_ttfb_ms` int(10) unsigned DEFAULT NULL AFTER `cold_ttfb_ms`;
@@ -0,0 +1,3 @@
+-- Peak memory of the cgroup of a stage's command including its children (deploy_script/stage_cgroup.py)
+ALTER TABLE `deployment_stage`
+  ADD COLUMN `peak_memory_kb` bigint(20) unsigned DEFAULT NULL AFTER `max_rss_kb`;
@@ -9,8 +9,21 @@ fi
 cd /opt/Catroweb-AutoDeploy
 git fetch
 git reset --hard origin/master
-cat deploy_script/prdeployer.py > /opt/prdeployer/prdeployer.py
+for module in deploy_script/*.py; do
+        # config.py contains production secrets
+        [ "$(basename "$module")" = 'config.py' ] && continue
+        cat "$module" > "/opt/prdeployer/$(basename "$module")"
+done
+cat deploy_script/nginx-suspended.template > /opt/prdeployer/nginx-suspended.template
+cat deploy_script/nginx-server-block.template > /opt/prdeployer/nginx-server-block.template
+cat deploy_script/status-page.template > /opt/prdeployer/status-page.template
+# only the front end of the multi-host mode has this site (see INSTALL.md)
+if [ -f /etc/nginx/sites-available/prdeployer-front ]; then
+        cat nginx_front_site > /etc/nginx/sites-available/prdeployer-front
+fi
 cat index_page/index.php > /var/www/index/index.php
+cat index_page/wake.php > /var/www/index/wake.php
+cat index_page/log.php > /var/www/index/log.php
 cat index_page/config.inc.php > /var/www/index/config.inc.php
-echo "Only prdeployer.py and index.php are updated automatically."
+echo "Only the Python modules (except config.py), the templates and the index page are updated automatically."
 echo "Please update overwrite folder etc. manually!"